@@ -0,0 +1,191 @@
+"""Benchmark runner for the library operations behind the app's pages.
+
+    python -m benchmarks.run                        # 1k, 100k and 1M books, both backends
+    python -m benchmarks.run --sizes 1000 100000 --backends json
+    python -m benchmarks.run --output new.json --compare old.json
+
+Every operation is run once under tracemalloc to record its peak memory
+(which also warms caches up), then timed ``--repeat`` times. Results are
+written as JSON together with the commit and Python version, and
+``--compare`` prints how each median changed against an earlier run.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+# Imported up front so the first measured run doesn't count their import
+import numpy  # noqa: F401
+import pandas as pd
+
+from benchmarks.synthetic import generate_books
+from library_core.library import Library
+
+SIZES = (1_000, 100_000, 1_000_000)
+QUERIES = ('river', 'novak', 'shadw garden', 'science fiction', 'the lost')
+PAGE_SIZE = 50
+# A median this much slower than the compared run is reported as a regression
+REGRESSION_RATIO = 1.2
+
+
+def open_store(backend, path):
+    # Opens the store directly: backends.open_store would migrate a
+    # library.json from the working directory into a new SQLite file
+    if backend == 'json':
+        from library_core.storage import JournalStore
+
+        return JournalStore(path)
+    from library_core.sqlite_store import SqliteStore
+
+    return SqliteStore(path)
+
+
+def measure(name, fn, repeat):
+    # fn(run) is called repeat + 1 times with distinct run numbers
+    tracemalloc.start()
+    fn(0)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    timings = []
+    for run in range(1, repeat + 1):
+        start = time.perf_counter()
+        fn(run)
+        timings.append(time.perf_counter() - start)
+    return {'name': name, 'runs': repeat, 'min': min(timings), 'median': statistics.median(timings),
+            'mean': statistics.fmean(timings), 'peak_bytes': peak}
+
+
+def dashboard_frame(books):
+    # Mirrors books_to_frame in library_manager.py
+    df = pd.DataFrame(books, columns=['title', 'author', 'publication_year', 'genre', 'read_status'])
+    df['read_status'] = pd.Categorical.from_codes(df['read_status'].astype(int), categories=['📖 Unread', '✅ Read'])
+    return df
+
+
+def replay(listener, catalog):
+    # Builds a catalog listener from scratch, as Library does on first use
+    for key in catalog.keys():
+        listener.added(key, catalog.get(key))
+    return listener
+
+
+def run_benchmarks(backend, size, repeat, directory):
+    from library_core.recommend import Recommender
+    from library_core.search import SearchIndex
+    from library_core.stats import LibraryStats
+
+    path = os.path.join(directory, f"library-{size}.{'json' if backend == 'json' else 'db'}")
+    library = Library(open_store(backend, path), books=generate_books(size))
+    results = [measure('save_library', lambda run: library.save(), repeat)]
+    library.close()
+
+    results.append(measure('load_library', lambda run: Library(open_store(backend, path)).close(), repeat))
+    library = Library(open_store(backend, path))
+    catalog = library.catalog
+    if backend == 'json':
+        # SQLite searches in SQL and has no in-memory index
+        results.append(measure('build_search_index', lambda run: replay(SearchIndex(), catalog), repeat))
+    library.search(QUERIES[0])
+    results.append(measure('search', lambda run: library.search(QUERIES[run % len(QUERIES)]), repeat))
+    results.append(measure('get_filtered_library', lambda run: library.page(False, page=run + 1, page_size=PAGE_SIZE), repeat))
+    results.append(measure('get_filtered_library_sorted',
+                           lambda run: library.page(False, page=run + 1, page_size=PAGE_SIZE, sort_by='title', descending=True), repeat))
+    if backend == 'json':
+        # SQLite keeps its statistics in the database and builds the
+        # recommender from a scan of the table
+        results.append(measure('build_stats', lambda run: replay(LibraryStats(), catalog), repeat))
+    library.summary()
+    results.append(measure('get_library_stats', lambda run: library.summary(), repeat))
+    if backend == 'json':
+        results.append(measure('build_recommender', lambda run: replay(Recommender(), catalog), repeat))
+    library.recommend()
+    # A different limit each run, so the cached result isn't reused
+    results.append(measure('recommend', lambda run: library.recommend(limit=11 + run), repeat))
+    results.append(measure('dashboard_frame', lambda run: dashboard_frame(library.page(None, page=run + 1, page_size=PAGE_SIZE)), repeat))
+
+    # Each run marks or removes a different book
+    unread = [book['title'] for book in library.page(False, page_size=repeat + 1)]
+    read = [book['title'] for book in library.page(True, page_size=repeat + 1)]
+    results.append(measure('mark_read', lambda run: library.mark_read(unread[run]), repeat))
+    results.append(measure('remove', lambda run: library.remove(read[run]), repeat))
+    library.close()
+    for result in results:
+        result.update(backend=backend, books=size)
+    return results
+
+
+def max_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    previous = {(r['backend'], r['books'], r['name']): r for r in (baseline or [])}
+    print(f"{'backend':8} {'books':>9} {'operation':28} {'median':>10} {'min':>10} {'peak mem':>10}" + ('  vs baseline' if baseline else ''))
+    for result in results:
+        line = (f"{result['backend']:8} {result['books']:>9} {result['name']:28} {result['median'] * 1000:>8.2f}ms "
+                f"{result['min'] * 1000:>8.2f}ms {result['peak_bytes'] / 2 ** 20:>8.1f}MB")
+        old = previous.get((result['backend'], result['books'], result['name']))
+        if old:
+            ratio = result['median'] / old['median'] if old['median'] else float('inf')
+            line += f"  {ratio:5.2f}x" + ('  REGRESSION' if ratio > REGRESSION_RATIO else '')
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run', description="Benchmark library operations on synthetic libraries.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help="library sizes in books")
+    parser.add_argument('--backends', nargs='+', choices=['json', 'sqlite'], default=['json', 'sqlite'])
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs per operation")
+    parser.add_argument('--output', default='benchmark-results.json', help="where to write the results")
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            for backend in args.backends:
+                print(f"Running {backend} with {size} books...", file=sys.stderr)
+                results.extend(run_benchmarks(backend, size, args.repeat, directory))
+    report = {
+        'commit': git_commit(),
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'max_rss_bytes': max_rss_bytes(),
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            baseline = json.load(file)['results']
+    print_results(results, baseline)
+    print(f"Results written to {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,57 @@
+"""Synthetic library generator for benchmarks and manual testing.
+
+    python -m benchmarks.synthetic 100000 books.jsonl
+
+writes a file that can be loaded with Bulk Import or ``library-manager import``.
+"""
+
+import random
+import sys
+
+from library_core.validation import GENRES
+
+WORDS = (
+    "shadow river night garden winter silent lost empire city star house ocean "
+    "memory fire stone crown dream secret glass iron forest road storm light "
+    "daughter king time war song blood wind moon island kingdom sea heart "
+    "mountain journey last first wild broken golden hidden little dark"
+).split()
+FIRST_NAMES = (
+    "Anna James Maria John Olga Peter Sara David Elena Mark Amira Hugo Yuki Omar "
+    "Ines Lars Priya Tomas Chen Nadia Felix Ada Ivan Leila Noah Rosa Karl Mei"
+).split()
+LAST_NAMES = (
+    "Smith Novak Garcia Chen Okafor Muller Rossi Tanaka Silva Kowalski Haddad "
+    "Larsen Petrov Dubois Kim Singh Ahmed Costa Berg Moreau Ivanova Sato Nunez"
+).split()
+
+
+def generate_books(count, seed=0):
+    # Yields count reproducible books; (title, author) pairs are unique and
+    # titles share words, so search has realistic posting lists.
+    rng = random.Random(seed)
+    for number in range(count):
+        words = rng.sample(WORDS, rng.randint(1, 3))
+        title = f"The {' '.join(words).title()} {number}" if rng.random() < 0.3 else f"{' '.join(words).title()} {number}"
+        author = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        # Most books are recent, a long tail goes back to MIN_YEAR
+        year = 2025 - int(rng.expovariate(1 / 40)) % 1000
+        yield {'title': title, 'author': author, 'publication_year': year,
+               'genre': rng.choice(GENRES), 'read_status': rng.random() < 0.3}
+
+
+def main(argv=None):
+    from library_core.bulk import detect_format, export_books
+
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print("usage: python -m benchmarks.synthetic COUNT FILE", file=sys.stderr)
+        return 2
+    count, path = int(argv[0]), argv[1]
+    export_books(generate_books(count), path, detect_format(path))
+    print(f"Wrote {count} books to {path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
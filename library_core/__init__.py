@@ -0,0 +1 @@
+"""Core library logic for the Personal Library Manager, independent of the UI."""
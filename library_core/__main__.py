@@ -0,0 +1,3 @@
+from library_core.cli import main
+
+raise SystemExit(main())
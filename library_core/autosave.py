@@ -0,0 +1,85 @@
+"""Background writer for write-behind saving.
+
+With autosave a Library applies changes in memory and queues their journal
+entries; an ``AutosaveWriter`` thread then flushes the queue in one batch
+(one write and fsync) ``interval`` seconds after the first unsaved change,
+or as soon as ``max_pending`` changes are waiting. Whatever is still queued
+is flushed by ``close()`` and when the interpreter exits.
+"""
+
+import atexit
+import threading
+import time
+
+
+class AutosaveWriter:
+    def __init__(self, flush, pending, interval=2.0, max_pending=100):
+        # flush() writes the queued changes; pending() says how many there are
+        self._flush = flush
+        self._pending = pending
+        self.interval = interval
+        self.max_pending = max_pending
+        self.last_flush = None
+        self.last_error = None
+        self._dirty_since = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='library-autosave', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def mark_dirty(self):
+        with self._condition:
+            if self._dirty_since is None:
+                self._dirty_since = time.monotonic()
+            self._condition.notify()
+
+    def flush(self):
+        # Writes the queued changes now, on the calling thread
+        try:
+            self._flush()
+        except Exception as e:
+            with self._condition:
+                self.last_error = e
+                # Retry after another interval
+                self._dirty_since = time.monotonic()
+            raise
+        with self._condition:
+            self._dirty_since = time.monotonic() if self._pending() else None
+            self.last_flush = time.time()
+            self.last_error = None
+
+    def close(self):
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        atexit.unregister(self.close)
+        self.flush()
+
+    def status(self):
+        with self._condition:
+            return {'pending': self._pending(), 'last_flush': self.last_flush, 'last_error': self.last_error}
+
+    def _run(self):
+        while True:
+            with self._condition:
+                # Sleep until the oldest unsaved change is interval seconds
+                # old, the batch is full or the writer is closed
+                while not self._closed:
+                    if self._dirty_since is None:
+                        self._condition.wait()
+                        continue
+                    remaining = self._dirty_since + self.interval - time.monotonic()
+                    if remaining <= 0 or (self._pending() >= self.max_pending and self.last_error is None):
+                        break
+                    self._condition.wait(remaining)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception:
+                # Kept in last_error for the UI
+                pass
@@ -0,0 +1,31 @@
+"""Selects the storage backend from configuration."""
+
+import os
+
+BACKENDS = ('json', 'sqlite', 'mmap')
+
+
+def open_store(backend=None, path=None):
+    # Picks the backend from the arguments or the LIBRARY_BACKEND and
+    # LIBRARY_PATH environment variables; defaults to the JSON journal.
+    # LIBRARY_SNAPSHOT_FORMAT=binary makes the journal write binary snapshots.
+    backend = backend or os.environ.get('LIBRARY_BACKEND', 'json')
+    path = path or os.environ.get('LIBRARY_PATH')
+    if backend == 'json':
+        from library_core.storage import JournalStore
+
+        return JournalStore(path or 'library.json', snapshot_format=os.environ.get('LIBRARY_SNAPSHOT_FORMAT', 'json'))
+    if backend == 'sqlite':
+        from library_core.sqlite_store import SqliteStore, migrate_json
+
+        path = path or 'library.db'
+        # First start on SQLite imports the existing JSON library once
+        if not os.path.exists(path) and os.path.exists('library.json'):
+            migrate_json('library.json', path)
+        return SqliteStore(path)
+    if backend == 'mmap':
+        from library_core.mapped import MappedStore
+
+        # Read-only archive built with python -m library_core.mapped
+        return MappedStore(path or 'library.bin')
+    raise ValueError(f"Unknown storage backend {backend!r}, expected one of {', '.join(BACKENDS)}")
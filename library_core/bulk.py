@@ -0,0 +1,186 @@
+"""Streaming bulk import and export for CSV, JSON Lines and Parquet.
+
+Files are read and written in chunks so memory stays bounded by the chunk
+size rather than the file size. Imported rows are validated with the same
+rules as the Add Book form, de-duplicated on (title, author) and committed to
+the store one batch per chunk. Parquet support needs pyarrow.
+"""
+
+import csv
+import io
+import json
+import os
+
+from library_core.catalog import normalize
+from library_core.validation import parse_book
+
+FORMATS = ('csv', 'jsonl', 'parquet')
+COLUMNS = ['title', 'author', 'publication_year', 'genre', 'read_status']
+MAX_REPORTED_ERRORS = 20
+
+
+def detect_format(name):
+    extension = os.path.splitext(name)[1].lower().lstrip('.')
+    if extension in ('jsonl', 'ndjson'):
+        return 'jsonl'
+    if extension in ('parquet', 'pq'):
+        return 'parquet'
+    if extension == 'csv':
+        return 'csv'
+    raise ValueError(f"Cannot tell the format of {name!r}; use one of {', '.join(FORMATS)}")
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ValueError("Parquet support requires pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+def _open_binary(source):
+    # Accepts a path or an already open binary file (e.g. a Streamlit upload)
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, 'rb'), True
+    return source, False
+
+
+def _size(file):
+    try:
+        position = file.tell()
+        size = file.seek(0, os.SEEK_END)
+        file.seek(position)
+        return size
+    except (AttributeError, OSError):
+        return None
+
+
+def read_chunks(source, fmt, chunk_size=10000):
+    # Yields (rows, fraction_read) with at most chunk_size raw row dicts each;
+    # a JSON Lines line that does not parse is passed on as its ValueError
+    if fmt == 'parquet':
+        pyarrow = _import_pyarrow()
+        parquet = pyarrow.parquet.ParquetFile(source)
+        total = parquet.metadata.num_rows or 1
+        done = 0
+        for batch in parquet.iter_batches(batch_size=chunk_size):
+            rows = batch.to_pylist()
+            done += len(rows)
+            yield rows, done / total
+        return
+    file, owned = _open_binary(source)
+    wrapper = None
+    try:
+        size = _size(file)
+        if fmt == 'csv':
+            wrapper = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+            lines = csv.DictReader(wrapper)
+        elif fmt == 'jsonl':
+            lines = (_json_row(line) for line in file if line.strip())
+        else:
+            raise ValueError(f"Unknown format {fmt!r}; use one of {', '.join(FORMATS)}")
+        rows = []
+        for row in lines:
+            rows.append(row)
+            if len(rows) >= chunk_size:
+                yield rows, file.tell() / size if size else 0.0
+                rows = []
+        if rows:
+            yield rows, 1.0
+    finally:
+        # Leave a caller's file open when the text wrapper goes away
+        if wrapper is not None and not owned:
+            wrapper.detach()
+        if owned:
+            file.close()
+
+
+def _json_row(line):
+    # A line that isn't valid JSON comes through as its error, so it counts
+    # as one invalid row instead of ending the import
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return ValueError(f"Not valid JSON ({e})")
+
+
+def import_books(source, fmt, commit, chunk_size=10000, progress=None):
+    # Validates and de-duplicates each chunk and hands it to commit(books),
+    # which returns how many of them it added (the rest were already in the
+    # library). Returns counts of imported, duplicate and invalid rows plus
+    # the first errors.
+    result = {'imported': 0, 'duplicates': 0, 'invalid': 0, 'errors': []}
+    seen = set()
+    row_number = 0
+    for rows, fraction in read_chunks(source, fmt, chunk_size):
+        books = []
+        for row in rows:
+            row_number += 1
+            try:
+                if isinstance(row, ValueError):
+                    raise row
+                book = parse_book(row)
+            except ValueError as e:
+                result['invalid'] += 1
+                if len(result['errors']) < MAX_REPORTED_ERRORS:
+                    result['errors'].append(f"Row {row_number}: {e}")
+                continue
+            # Duplicates within the file; commit() checks against the library
+            key = (normalize(book['title']), normalize(book['author']))
+            if key in seen:
+                result['duplicates'] += 1
+                continue
+            seen.add(key)
+            books.append(book)
+        if books:
+            added = commit(books)
+            result['imported'] += added
+            result['duplicates'] += len(books) - added
+        if progress:
+            progress(fraction, result)
+    return result
+
+
+def export_books(books, target, fmt, chunk_size=10000):
+    # Streams an iterable of book dicts to a path or binary file
+    if fmt == 'parquet':
+        pyarrow = _import_pyarrow()
+        schema = pyarrow.schema([('title', pyarrow.string()), ('author', pyarrow.string()),
+                                 ('publication_year', pyarrow.int16()), ('genre', pyarrow.string()),
+                                 ('read_status', pyarrow.bool_())])
+        with pyarrow.parquet.ParquetWriter(target, schema) as writer:
+            for chunk in _chunked(books, chunk_size):
+                writer.write_table(pyarrow.Table.from_pylist(chunk, schema=schema))
+        return
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}; use one of {', '.join(FORMATS)}")
+    file, owned = (open(target, 'wb'), True) if isinstance(target, (str, os.PathLike)) else (target, False)
+    try:
+        text = io.TextIOWrapper(file, encoding='utf-8', newline='', write_through=True)
+        if fmt == 'csv':
+            writer = csv.DictWriter(text, fieldnames=COLUMNS, extrasaction='ignore')
+            writer.writeheader()
+        for chunk in _chunked(books, chunk_size):
+            if fmt == 'csv':
+                writer.writerows(chunk)
+            else:
+                text.write(''.join(json.dumps({column: book[column] for column in COLUMNS}) + '\n' for book in chunk))
+        text.flush()
+        # Hand the underlying file back without closing it
+        text.detach()
+    finally:
+        if owned:
+            file.close()
+
+
+def _chunked(books, chunk_size):
+    chunk = []
+    for book in books:
+        chunk.append(book)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
@@ -0,0 +1,363 @@
+"""In-memory columnar catalog with hash indexes for constant-time lookups."""
+
+import threading
+from array import array
+
+# Books handed to a Backfill's listener per turn of the lock
+BACKFILL_CHUNK = 2000
+
+
+def normalize(text):
+    return text.lower()
+
+
+class Catalog:
+    # Books are held column by column rather than as one dict per book:
+    # ids, titles in a list, authors and genres as codes into interned string
+    # tables, years as int16 and read status as one byte, plus the version
+    # (journal sequence number of the last change) of each book. A book's key
+    # is its row number; removed rows are tombstoned in the alive column.
+    # Book dicts are only built for the rows a caller asks for.
+    #
+    # One index maps book ids to keys. The others map a normalized title, and
+    # a normalized (title, author) pair, to a key, or to an insertion-ordered
+    # set of keys (a dict with None values) once several books share it, so
+    # lookups, inserts and deletes never scan the library.
+    def __init__(self, books=()):
+        self._ids = array('q')
+        self._titles = []
+        self._authors = array('I')
+        self._genres = array('H')
+        self._years = array('h')
+        self._read = bytearray()
+        self._versions = array('q')
+        self._alive = bytearray()
+        self._count = 0
+        self._strings = {'author': ([], {}), 'genre': ([], {})}
+        self._by_id = {}
+        self._by_title = {}
+        self._by_title_author = {}
+        self._listeners = []
+        self._title_order = None
+        self.version = 0
+        for book in books:
+            self.add(book)
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return (self._book(row) for row in range(len(self._titles)) if self._alive[row])
+
+    def __reversed__(self):
+        return (self._book(row) for row in range(len(self._titles) - 1, -1, -1) if self._alive[row])
+
+    def books(self):
+        return list(self)
+
+    def subscribe(self, listener, replay=True):
+        # Listeners (search index, aggregates, ...) receive added(key, book),
+        # updated(key, old, book) and removed(key, book) calls; existing books
+        # are replayed as additions unless replay is False.
+        self._listeners.append(listener)
+        if replay:
+            for key in self.keys():
+                listener.added(key, self._book(key))
+
+    def keys(self):
+        return [row for row in range(len(self._titles)) if self._alive[row]]
+
+    def get(self, key):
+        if 0 <= key < len(self._titles) and self._alive[key]:
+            return self._book(key)
+        return None
+
+    def add(self, book):
+        # Raises ValueError if a book with the same id is already here
+        if book['id'] in self._by_id:
+            raise ValueError(f"A book with id {book['id']} is already in the catalog")
+        key = len(self._titles)
+        self._ids.append(book['id'])
+        self._by_id[book['id']] = key
+        self._titles.append(book['title'])
+        self._authors.append(self._intern('author', book['author']))
+        self._genres.append(self._intern('genre', book['genre']))
+        self._years.append(int(book['publication_year']))
+        self._read.append(bool(book['read_status']))
+        self._versions.append(book.get('version', 0))
+        self._alive.append(1)
+        self._count += 1
+        self.version += 1
+        self._index(key, book['title'], book['author'])
+        for listener in self._listeners:
+            listener.added(key, self._book(key))
+        return key
+
+    def update(self, key, **fields):
+        old = self._book(key)
+        reindex = 'title' in fields or 'author' in fields
+        if reindex:
+            self._unindex(key, old['title'], old['author'])
+        if 'title' in fields:
+            self._titles[key] = fields['title']
+        if 'author' in fields:
+            self._authors[key] = self._intern('author', fields['author'])
+        if 'genre' in fields:
+            self._genres[key] = self._intern('genre', fields['genre'])
+        if 'publication_year' in fields:
+            self._years[key] = int(fields['publication_year'])
+        if 'read_status' in fields:
+            self._read[key] = bool(fields['read_status'])
+        if 'version' in fields:
+            self._versions[key] = fields['version']
+        book = self._book(key)
+        if reindex:
+            self._index(key, book['title'], book['author'])
+        self.version += 1
+        for listener in self._listeners:
+            listener.updated(key, old, book)
+        return book
+
+    def set_id(self, key, book_id):
+        # Ids aren't part of any book listeners index, so they aren't told
+        del self._by_id[self._ids[key]]
+        self._ids[key] = book_id
+        self._by_id[book_id] = key
+
+    def set_version(self, key, version):
+        # Versions aren't indexed, so listeners aren't told
+        self._versions[key] = version
+
+    def remove(self, key):
+        book = self._book(key)
+        self._alive[key] = 0
+        # Drop the title so tombstoned rows don't keep large strings alive
+        self._titles[key] = ''
+        self._count -= 1
+        self.version += 1
+        del self._by_id[book['id']]
+        self._unindex(key, book['title'], book['author'])
+        for listener in self._listeners:
+            listener.removed(key, book)
+        return book
+
+    def next_key(self):
+        # The key the next book added gets; every key below it is a row,
+        # removed or not
+        return len(self._titles)
+
+    def key_for_id(self, book_id):
+        # None if no book has this id
+        return self._by_id.get(book_id)
+
+    def id_of(self, key):
+        return self._ids[key]
+
+    def keys_for_title(self, title):
+        return _index_keys(self._by_title, normalize(title))
+
+    def keys_for_book(self, title, author):
+        return _index_keys(self._by_title_author, (normalize(title), normalize(author)))
+
+    def contains(self, title, author):
+        return (normalize(title), normalize(author)) in self._by_title_author
+
+    def rows(self, read_status=None, sort_by=None, descending=False):
+        # Vectorized selection: returns the keys of the matching books as a
+        # NumPy array, optionally ordered by a column.
+        import numpy as np
+
+        mask = np.frombuffer(self._alive, dtype=np.bool_)
+        if read_status is not None:
+            read = np.frombuffer(self._read, dtype=np.bool_)
+            mask = mask & (read if read_status else ~read)
+        keys = np.flatnonzero(mask)
+        if sort_by is not None:
+            keys = keys[np.argsort(self._sort_column(sort_by)[keys], kind='stable')]
+        if descending:
+            keys = keys[::-1]
+        return keys
+
+    def select(self, read_status=None, genres=None, authors=None, min_year=None, max_year=None):
+        # Keys of the books matching every given criterion, as a NumPy array
+        # in insertion order; genres and authors are collections of names
+        # (authors compared case-insensitively).
+        import numpy as np
+
+        mask = np.frombuffer(self._alive, dtype=np.bool_).copy()
+        if read_status is not None:
+            read = np.frombuffer(self._read, dtype=np.bool_)
+            mask &= read if read_status else ~read
+        if genres is not None:
+            mask &= np.isin(self._column('genre'), self._codes('genre', genres, str))
+        if authors is not None:
+            mask &= np.isin(self._column('author'), self._codes('author', authors, normalize))
+        if min_year is not None:
+            mask &= self._column('publication_year') >= min_year
+        if max_year is not None:
+            mask &= self._column('publication_year') <= max_year
+        return np.flatnonzero(mask)
+
+    def _column(self, field):
+        import numpy as np
+
+        column, dtype = {
+            'author': (self._authors, np.uint32),
+            'genre': (self._genres, np.uint16),
+            'publication_year': (self._years, np.int16),
+            'read_status': (self._read, np.bool_),
+        }[field]
+        return np.frombuffer(column, dtype=dtype)
+
+    def _codes(self, field, names, fold):
+        # Codes of the interned strings whose folded form is one of names
+        names = {fold(name) for name in names}
+        strings, _ = self._strings[field]
+        return [code for code, text in enumerate(strings) if fold(text) in names]
+
+    def _sort_column(self, field):
+        import numpy as np
+
+        if field in ('publication_year', 'read_status'):
+            return self._column(field)
+        if field in ('author', 'genre'):
+            # Rank the interned strings once, then sort rows by their rank
+            strings, _ = self._strings[field]
+            order = sorted(range(len(strings)), key=lambda code: strings[code].lower())
+            ranks = np.empty(len(strings), dtype=np.int64)
+            ranks[order] = np.arange(len(strings))
+            return ranks[self._column(field)]
+        # Title ranks are cached until the catalog changes
+        if self._title_order is None or self._title_order[0] != self.version:
+            order = sorted(range(len(self._titles)), key=lambda row: self._titles[row].lower())
+            ranks = np.empty(len(self._titles), dtype=np.int64)
+            ranks[order] = np.arange(len(self._titles))
+            self._title_order = (self.version, ranks)
+        return self._title_order[1]
+
+    def _book(self, key):
+        return {
+            'id': self._ids[key],
+            'title': self._titles[key],
+            'author': self._strings['author'][0][self._authors[key]],
+            'publication_year': self._years[key],
+            'genre': self._strings['genre'][0][self._genres[key]],
+            'read_status': bool(self._read[key]),
+            'version': self._versions[key],
+        }
+
+    def _intern(self, field, value):
+        strings, codes = self._strings[field]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(strings)
+            strings.append(value)
+        return code
+
+    def _index(self, key, title, author):
+        title = normalize(title)
+        _index_add(self._by_title, title, key)
+        _index_add(self._by_title_author, (title, normalize(author)), key)
+
+    def _unindex(self, key, title, author):
+        title = normalize(title)
+        _index_remove(self._by_title, title, key)
+        _index_remove(self._by_title_author, (title, normalize(author)), key)
+
+
+
+class Backfill:
+    # Subscribes listener to catalog and hands it the books already there
+    # from a background thread, a chunk at a time, taking lock (the one every
+    # change to the catalog is made under) for each chunk only, so a large
+    # catalog doesn't stall its other users for the whole build. Changes to
+    # rows already handed over are passed on as they happen; later rows are
+    # read as they are when their chunk comes.
+    def __init__(self, catalog, listener, lock, chunk=BACKFILL_CHUNK):
+        self.listener = listener
+        self.ready = threading.Event()
+        self.error = None
+        self._catalog = catalog
+        self._lock = lock
+        self._chunk = chunk
+        self._next = 0          # rows below this have been handed over
+        self._cancelled = False
+        with lock:
+            catalog.subscribe(self, replay=False)
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def wait(self):
+        # Returns the listener once it has every book
+        self.ready.wait()
+        if self.error is not None:
+            raise self.error
+        return self.listener
+
+    def cancel(self):
+        # Stops the thread, for a catalog that is being dropped, and wakes
+        # anyone waiting; call with the lock held
+        self._cancelled = True
+        self.ready.set()
+
+    def added(self, key, book):
+        if self._handed_over(key):
+            self.listener.added(key, book)
+
+    def updated(self, key, old, book):
+        if self._handed_over(key):
+            self.listener.updated(key, old, book)
+
+    def removed(self, key, book):
+        if self._handed_over(key):
+            self.listener.removed(key, book)
+
+    def _handed_over(self, key):
+        return key < self._next or self.ready.is_set()
+
+    def _run(self):
+        try:
+            while True:
+                with self._lock:
+                    if self._cancelled:
+                        return
+                    end = min(self._next + self._chunk, self._catalog.next_key())
+                    for key in range(self._next, end):
+                        book = self._catalog.get(key)
+                        if book is not None:
+                            self.listener.added(key, book)
+                    self._next = end
+                    if end == self._catalog.next_key():
+                        self.ready.set()
+                        return
+        except BaseException as e:
+            self.error = e
+            self.ready.set()
+
+
+def _index_add(index, index_key, key):
+    existing = index.get(index_key)
+    if existing is None:
+        index[index_key] = key
+    elif isinstance(existing, dict):
+        existing[key] = None
+    else:
+        index[index_key] = {existing: None, key: None}
+
+
+def _index_remove(index, index_key, key):
+    existing = index[index_key]
+    if isinstance(existing, dict):
+        del existing[key]
+        if len(existing) == 1:
+            index[index_key] = next(iter(existing))
+    else:
+        del index[index_key]
+
+
+def _index_keys(index, index_key):
+    existing = index.get(index_key)
+    if existing is None:
+        return []
+    if isinstance(existing, dict):
+        return list(existing)
+    return [existing]
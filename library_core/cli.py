@@ -0,0 +1,144 @@
+"""Command line interface: ``library-manager`` (or ``python -m library_core``)."""
+
+import argparse
+import sys
+
+from library_core.backends import BACKENDS
+from library_core.history import PERIODS
+from library_core.validation import GENRES
+
+
+def _print_books(books):
+    for book in books:
+        status = 'read' if book['read_status'] else 'unread'
+        print(f"{book['id']} | {book['title']} | {book['author']} | {book['publication_year']} | {book['genre']} | {status}")
+
+
+def _progress(fraction, result):
+    bar = '#' * int(fraction * 30)
+    sys.stderr.write(f"\r[{bar:<30}] {fraction:6.1%} {result['imported']} imported")
+    sys.stderr.flush()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='library-manager', description="Manage your personal library from the command line.")
+    parser.add_argument('--backend', choices=BACKENDS, help="storage backend (default: LIBRARY_BACKEND or json)")
+    parser.add_argument('--path', help="library file (default: LIBRARY_PATH, library.json, library.db or library.bin)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('add', help="add a book")
+    add.add_argument('title')
+    add.add_argument('author')
+    add.add_argument('--year', type=int, required=True)
+    add.add_argument('--genre', choices=GENRES, default='Other')
+    add.add_argument('--read', action='store_true', help="mark the book as read")
+
+    remove = commands.add_parser('remove', help="remove every book with a title, or one book by id")
+    remove.add_argument('title', nargs='?')
+    remove.add_argument('--id', type=int, help="id shown by list and search")
+
+    mark = commands.add_parser('mark-read', help="mark a book as read, by title or id")
+    mark.add_argument('title', nargs='?')
+    mark.add_argument('--id', type=int, help="id shown by list and search")
+
+    search = commands.add_parser('search', help="search title, author and genre")
+    search.add_argument('query')
+    search.add_argument('--field', choices=['title', 'author', 'genre'])
+    search.add_argument('--limit', type=int, default=20)
+
+    list_books = commands.add_parser('list', help="list books")
+    list_books.add_argument('--status', choices=['all', 'read', 'unread'], default='all')
+    list_books.add_argument('--sort', choices=['title', 'author', 'publication_year', 'genre'])
+    list_books.add_argument('--limit', type=int)
+
+    commands.add_parser('stats', help="show library statistics")
+
+    goal = commands.add_parser('goal', help="set a reading goal, e.g. goal 12 year (0 removes it)")
+    goal.add_argument('target', type=int)
+    goal.add_argument('period', choices=PERIODS)
+    goal.add_argument('--genre', choices=GENRES)
+
+    commands.add_parser('goals', help="show progress towards reading goals")
+
+    import_books = commands.add_parser('import', help="bulk import a CSV, JSON Lines or Parquet file")
+    import_books.add_argument('file')
+    import_books.add_argument('--format', choices=['csv', 'jsonl', 'parquet'], help="defaults to the file extension")
+    import_books.add_argument('--chunk-size', type=int, default=10000)
+
+    export_books = commands.add_parser('export', help="export the library to CSV, JSON Lines or Parquet")
+    export_books.add_argument('file')
+    export_books.add_argument('--format', choices=['csv', 'jsonl', 'parquet'], help="defaults to the file extension")
+    export_books.add_argument('--chunk-size', type=int, default=10000)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command in ('remove', 'mark-read') and (args.title is None) == (args.id is None):
+        parser.error(f"{args.command} takes a title or --id")
+
+    from library_core.backends import open_store
+    from library_core.library import Library
+
+    library = Library(open_store(args.backend, args.path))
+    try:
+        return run(library, args)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        library.close()
+
+
+def run(library, args):
+    if args.command == 'add':
+        book_id = library.add({'title': args.title, 'author': args.author, 'publication_year': args.year,
+                               'genre': args.genre, 'read_status': args.read})
+        print(f"'{args.title}' by {args.author} added to your library with id {book_id}!")
+    elif args.command in ('remove', 'mark-read') and args.id is not None:
+        changed = library.remove_books([args.id]) if args.command == 'remove' else library.update_books([args.id], read_status=True)
+        if not changed:
+            print(f"No book has id {args.id}.", file=sys.stderr)
+            return 1
+        print(f"Book {args.id} {'removed' if args.command == 'remove' else 'marked as read'}!")
+    elif args.command == 'remove':
+        if not library.remove(args.title):
+            print(f"Book '{args.title}' not found.", file=sys.stderr)
+            return 1
+        print(f"Book '{args.title}' removed!")
+    elif args.command == 'mark-read':
+        if not library.mark_read(args.title):
+            print(f"Book '{args.title}' not found.", file=sys.stderr)
+            return 1
+        print(f"'{args.title}' marked as read!")
+    elif args.command == 'search':
+        _print_books(library.search(args.query, field=args.field, limit=args.limit))
+    elif args.command == 'list':
+        read_status = {'all': None, 'read': True, 'unread': False}[args.status]
+        _print_books(library.page(read_status, page_size=args.limit, sort_by=args.sort))
+    elif args.command == 'stats':
+        stats = library.summary()
+        print(f"Total books: {stats['total']}")
+        print(f"Books read: {stats['read']} ({stats['percent_read']:.1f}%)")
+        for genre, count in sorted(stats['genres'].items(), key=lambda item: -item[1]):
+            print(f"  {genre}: {count}")
+    elif args.command == 'goal':
+        library.set_goal(args.period, args.target, args.genre)
+        genre = f" {args.genre}" if args.genre else ''
+        print(f"Goal set: {args.target}{genre} books a {args.period}." if args.target else f"Goal removed: {genre.strip() or 'all'} books a {args.period}.")
+    elif args.command == 'goals':
+        for goal in library.goal_progress():
+            genre = f"{goal['genre']} " if goal['genre'] else ''
+            pace = 'on track' if goal['read'] >= goal['expected'] else f"{goal['expected'] - goal['read']:.1f} behind pace"
+            print(f"{goal['read']}/{goal['target']} {genre}books this {goal['period']} (until {goal['end']}, {pace})")
+    elif args.command == 'import':
+        result = library.import_file(args.file, args.format, args.chunk_size, _progress)
+        sys.stderr.write('\n')
+        print(f"Imported {result['imported']} books, skipped {result['duplicates']} duplicates and {result['invalid']} invalid rows")
+        for error in result['errors']:
+            print(f"  {error}")
+    elif args.command == 'export':
+        library.export_file(args.file, args.format, args.chunk_size)
+        print(f"Exported {len(library)} books to {args.file}")
+    return 0
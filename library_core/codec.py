@@ -0,0 +1,199 @@
+"""Serialization for snapshots and journal entries.
+
+JSON goes through orjson when it is installed (``pip install orjson``) and
+falls back to the standard library, writing compact UTF-8 either way.
+
+Snapshots can also be written in a column-packed binary format, the same
+layout the catalog keeps in memory:
+
+- a header with the sequence number and the number of books
+- string tables for authors, genres and titles: a count, count + 1 byte
+  offsets and the UTF-8 text
+- the keys in title order, for lookups and sorting without reading titles
+- one little-endian array per field: ids, author and genre codes, years,
+  versions and read flags
+
+Every section starts on an 8-byte boundary, so the file can be memory-mapped
+and its arrays used in place (see ``mapped``). ``loads_snapshot`` tells the
+formats apart by their first bytes, so a library can switch formats at any
+time.
+"""
+
+import itertools
+import json
+import struct
+import sys
+from array import array
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+SNAPSHOT_FORMATS = ('json', 'binary')
+MAGIC = b'LIBCOL'
+FORMAT_VERSION = 3
+# magic, format version, sequence number, number of books
+_HEADER = struct.Struct('<6sBxqQ')
+_COUNT = struct.Struct('<Q')
+# Per-book columns after the string tables and title order
+COLUMNS = (('id', 'q'), ('author', 'I'), ('genre', 'H'), ('publication_year', 'h'), ('version', 'q'), ('read_status', 'B'))
+
+
+class CorruptSnapshotError(ValueError):
+    pass
+
+
+def dumps(obj):
+    # Compact JSON as UTF-8 bytes
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps_snapshot(books, seq, fmt='json'):
+    if fmt == 'binary':
+        return _pack(books, seq)
+    if fmt == 'json':
+        # seq comes first so peek_snapshot_seq can read it without parsing
+        return dumps({'seq': seq, 'books': books})
+    raise ValueError(f"Unknown snapshot format {fmt!r}, expected one of {', '.join(SNAPSHOT_FORMATS)}")
+
+
+def loads_snapshot(data):
+    # Returns (books, seq) for a binary or JSON snapshot; plain JSON lists
+    # are the pre-journal library.json format
+    if is_binary(data):
+        return _unpack(data)
+    library = loads(data)
+    if isinstance(library, list):
+        return library, 0
+    return library['books'], library['seq']
+
+
+def is_binary(data):
+    return data[:len(MAGIC)] == MAGIC
+
+
+def peek_seq(head):
+    # Sequence number of a binary snapshot from its first bytes
+    return _HEADER.unpack_from(head)[2]
+
+
+def snapshot_layout(buffer):
+    # Parses the header and section offsets of a binary snapshot without
+    # copying anything. Returns the sequence number, the number of books and
+    # {section: offset}; string tables map to (count, offsets at, text at).
+    try:
+        magic, version, seq, count = _HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise CorruptSnapshotError(f"Not a version {FORMAT_VERSION} binary snapshot")
+        sections = {}
+        position = _HEADER.size
+        for table in ('author_table', 'genre_table', 'title'):
+            (n,) = _COUNT.unpack_from(buffer, position)
+            offsets_at = position + _COUNT.size
+            text_at = offsets_at + 8 * (n + 1)
+            (size,) = _COUNT.unpack_from(buffer, text_at - 8)
+            sections[table] = (n, offsets_at, text_at)
+            position = _align(text_at + size)
+        sections['title_order'] = position
+        position = _align(position + 4 * count)
+        for field, typecode in COLUMNS:
+            sections[field] = position
+            end = position + array(typecode).itemsize * count
+            position = _align(end)
+    except struct.error as e:
+        raise CorruptSnapshotError(f"Binary snapshot is corrupted: {e}") from e
+    if end > len(buffer):
+        raise CorruptSnapshotError("Binary snapshot is truncated")
+    return seq, count, sections
+
+
+def _align(position):
+    return (position + 7) & ~7
+
+
+def _pack(books, seq):
+    titles = []
+    strings = {'author': {}, 'genre': {}}
+    columns = {field: array(typecode) for field, typecode in COLUMNS}
+    for book in books:
+        titles.append(book['title'])
+        columns['id'].append(book['id'])
+        columns['author'].append(strings['author'].setdefault(book['author'], len(strings['author'])))
+        columns['genre'].append(strings['genre'].setdefault(book['genre'], len(strings['genre'])))
+        columns['publication_year'].append(int(book['publication_year']))
+        columns['version'].append(book.get('version', 0))
+        columns['read_status'].append(bool(book['read_status']))
+    # Same order as the catalog's title sort: case-insensitive, stable
+    title_order = array('I', sorted(range(len(titles)), key=lambda key: titles[key].lower()))
+
+    parts = [_HEADER.pack(MAGIC, FORMAT_VERSION, seq, len(titles))]
+    for table in (list(strings['author']), list(strings['genre']), titles):
+        encoded = [text.encode('utf-8') for text in table]
+        offsets = array('Q', itertools.accumulate(map(len, encoded), initial=0))
+        parts += [_COUNT.pack(len(table)), _little_endian(offsets), b''.join(encoded)]
+        parts.append(_padding(parts))
+    for column in [title_order] + [columns[field] for field, _ in COLUMNS]:
+        parts.append(_little_endian(column))
+        parts.append(_padding(parts))
+    return b''.join(parts)
+
+
+def _padding(parts):
+    return bytes(-sum(map(len, parts)) % 8)
+
+
+def _unpack(data):
+    seq, count, sections = snapshot_layout(data)
+    try:
+        author_table, genre_table, titles = (_strings(data, *sections[table]) for table in ('author_table', 'genre_table', 'title'))
+    except UnicodeDecodeError as e:
+        raise CorruptSnapshotError(f"Binary snapshot is corrupted: {e}") from e
+    columns = [_array(typecode, data, sections[field], count) for field, typecode in COLUMNS]
+    if len(titles) != count:
+        raise CorruptSnapshotError("Binary snapshot is corrupted: wrong number of titles")
+    return _books(titles, author_table, genre_table, *columns), seq
+
+
+def _strings(data, n, offsets_at, text_at):
+    offsets = _array('Q', data, offsets_at, n + 1)
+    blob = data[text_at:text_at + offsets[-1]]
+    text = blob.decode('utf-8')
+    if len(text) == len(blob):
+        # ASCII: byte offsets are character offsets
+        return [text[start:end] for start, end in itertools.pairwise(offsets)]
+    return [blob[start:end].decode('utf-8') for start, end in itertools.pairwise(offsets)]
+
+
+def _books(titles, author_table, genre_table, ids, authors, genres, years, versions, read):
+    return [
+        {'id': book_id, 'title': title, 'author': author_table[author], 'publication_year': year,
+         'genre': genre_table[genre], 'read_status': bool(flag), 'version': book_version}
+        for book_id, title, author, genre, year, book_version, flag in zip(ids, titles, authors, genres, years, versions, read)
+    ]
+
+
+def _little_endian(column):
+    if sys.byteorder == 'big':
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def _array(typecode, data, offset, count):
+    column = array(typecode)
+    end = offset + count * column.itemsize
+    if end > len(data):
+        raise CorruptSnapshotError("Binary snapshot is truncated")
+    column.frombytes(data[offset:end])
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column
@@ -0,0 +1,239 @@
+"""Reading history and goals.
+
+Marking a book read or unread appends an event (the time, the book's id and
+genre) to ``<store path>.history``, one JSON line each. Reading goals, such as
+twelve books a year or two Fantasy books a month, are events in the same log.
+Unlike the journal, this log is never compacted, because it records when
+books were read.
+
+The events are folded into per-day buckets as they are read. Each bucket
+counts the books read that day, overall and per genre. A book counts on the
+last day it was marked read, for as long as it stays read, and removing a
+book doesn't uncount it. Window queries (this month, a rolling 30 days, books
+per month over years) are differences of prefix sums over the buckets. The
+sums are computed once per change, so each query costs the same however long
+the history is.
+"""
+
+import os
+import time
+from array import array
+from datetime import date, timedelta
+
+from library_core import codec
+
+PERIODS = ('week', 'month', 'year')
+
+
+def period_start(period, day):
+    # First day of the week (Monday), month or year containing day
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    if period == 'year':
+        return day.replace(month=1, day=1)
+    raise ValueError(f"Goal period {period!r} is not one of {', '.join(PERIODS)}")
+
+
+def period_end(period, day):
+    # Last day of the period containing day
+    start = period_start(period, day)
+    if period == 'week':
+        return start + timedelta(days=6)
+    if period == 'month':
+        return (start + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+    return start.replace(year=start.year + 1) - timedelta(days=1)
+
+
+def month_starts(first, last):
+    # First day of every month from first's month to last's
+    months = []
+    month = first.replace(day=1)
+    while month <= last:
+        months.append(month)
+        month = (month + timedelta(days=31)).replace(day=1)
+    return months
+
+
+class ReadingHistory:
+    # Without a path the history lives in memory only
+    def __init__(self, path=None):
+        self.path = path
+        self.version = 0
+        self._reset()
+        self.poll()
+
+    def record(self, events):
+        # Appends events ({'id', 'genre', 'read'} or {'goal', 'genre',
+        # 'target'}) stamped with the current time unless they have a 't',
+        # then reads the log up to its end, so events from other processes
+        # are applied in log order
+        now = round(time.time(), 3)
+        events = [dict(event, t=event.get('t', now)) for event in events]
+        if not events:
+            return
+        if self.path is None:
+            for event in events:
+                self._apply(event)
+            return
+        lines = [codec.dumps(event) + b'\n' for event in events]
+        with open(self.path, 'ab') as file:
+            if file.tell() and not self._ends_with_newline():
+                # A crash cut the last line short; start on a fresh one
+                lines.insert(0, b'\n')
+            file.write(b''.join(lines))
+            file.flush()
+            os.fsync(file.fileno())
+        self.poll()
+
+    def poll(self):
+        # Applies events other processes appended since the last call and
+        # returns how many there were
+        if self.path is None:
+            return 0
+        try:
+            with open(self.path, 'rb') as file:
+                stat = os.fstat(file.fileno())
+                if stat.st_ino == self._file_id and stat.st_size == self._offset:
+                    return 0
+                if stat.st_ino != self._file_id or stat.st_size < self._offset:
+                    # Replaced or truncated: start over
+                    self._reset()
+                file.seek(self._offset)
+                data = file.read()
+        except FileNotFoundError:
+            return 0
+        # A partial last line (a crash mid-append) is read once it is complete
+        end = data.rfind(b'\n') + 1
+        events = []
+        for line in data[:end].split(b'\n'):
+            try:
+                events.append(codec.loads(line))
+            except ValueError:
+                # Empty, or the remains of a line cut short by a crash
+                pass
+        for event in events:
+            self._apply(event)
+        self._file_id, self._offset = stat.st_ino, self._offset + end
+        return len(events)
+
+    def read_date(self, book_id):
+        # The day the book was last marked read, or None if it isn't read or
+        # was read before the history started
+        read = self._reads.get(book_id)
+        return date.fromordinal(read[0]) if read else None
+
+    def count(self, start, end, genre=None):
+        # Books read from start to end (dates, both included)
+        sums = self._prefix(genre)
+        lo, hi = self._clip(start.toordinal()), self._clip(end.toordinal() + 1)
+        return int(sums[hi] - sums[lo]) if hi > lo else 0
+
+    def rolling(self, days, start, end, genre=None):
+        # Books read in the days-long window ending on each day from start to
+        # end, as a NumPy array
+        import numpy as np
+
+        sums = self._prefix(genre)
+        ends = np.arange(start.toordinal() + 1, end.toordinal() + 2)
+        return sums[self._clip(ends)] - sums[self._clip(ends - days)]
+
+    def per_month(self, start=None, end=None, genre=None):
+        # (first day of the month, books read) for every month from start to
+        # end, by default the whole history
+        import numpy as np
+
+        if self._origin is None:
+            return []
+        start = start or date.fromordinal(self._origin)
+        end = end or date.fromordinal(self._origin + self._length - 1)
+        months = month_starts(start, end)
+        bounds = np.array([month.toordinal() for month in months] + [period_end('month', end).toordinal() + 1])
+        sums = self._prefix(genre)[self._clip(bounds)]
+        return list(zip(months, np.diff(sums).tolist()))
+
+    def progress(self, today=None):
+        # Each goal with the books read so far in its current period and the
+        # number a steady pace would have reached by today
+        today = today or date.today()
+        results = []
+        for (period, genre), target in sorted(self.goals.items(), key=lambda item: (PERIODS.index(item[0][0]), item[0][1] or '')):
+            start, end = period_start(period, today), period_end(period, today)
+            elapsed = ((today - start).days + 1) / ((end - start).days + 1)
+            results.append({'period': period, 'genre': genre, 'target': target, 'start': start, 'end': end,
+                            'read': self.count(start, today, genre), 'expected': target * elapsed})
+        return results
+
+    def _reset(self):
+        self.goals = {}          # (period, genre or None) -> books per period
+        self._origin = None      # ordinal of the day in bucket 0
+        self._buckets = {}       # genre -> array of books read per day
+        self._length = 0         # days covered by the buckets
+        self._reads = {}         # id of a book counted as read -> (ordinal, genre)
+        self._sums = {}          # genre or None -> (version, prefix sums)
+        self._file_id = None
+        self._offset = 0
+
+    def _ends_with_newline(self):
+        with open(self.path, 'rb') as file:
+            file.seek(-1, os.SEEK_END)
+            return file.read(1) == b'\n'
+
+    def _apply(self, event):
+        self.version += 1
+        if 'goal' in event:
+            goal = (event['goal'], event.get('genre'))
+            if event['target']:
+                self.goals[goal] = event['target']
+            else:
+                self.goals.pop(goal, None)
+            return
+        previous = self._reads.pop(event['id'], None)
+        if previous is not None:
+            self._bump(*previous, -1)
+        if event['read']:
+            read = (date.fromtimestamp(event['t']).toordinal(), event['genre'])
+            self._reads[event['id']] = read
+            self._bump(*read, 1)
+
+    def _bump(self, day, genre, delta):
+        if self._origin is None:
+            self._origin = day
+        if day < self._origin:
+            # Events from before the first day seen (clocks differ between
+            # machines): shift every bucket
+            shift = self._origin - day
+            for name, bucket in self._buckets.items():
+                self._buckets[name] = array('l', bytes(shift * bucket.itemsize)) + bucket
+            self._origin, self._length = day, self._length + shift
+        index = day - self._origin
+        self._length = max(self._length, index + 1)
+        bucket = self._buckets.setdefault(genre, array('l'))
+        if len(bucket) < self._length:
+            bucket.frombytes(bytes((self._length - len(bucket)) * bucket.itemsize))
+        bucket[index] += delta
+
+    def _prefix(self, genre):
+        # Running totals of the day buckets, with a leading 0, so the books
+        # read on days [a, b) are sums[b - origin] - sums[a - origin]
+        import numpy as np
+
+        cached = self._sums.get(genre)
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        daily = np.zeros(self._length, dtype=np.int64)
+        for name, bucket in self._buckets.items():
+            if genre is None or name == genre:
+                daily[:len(bucket)] += np.frombuffer(bucket, dtype=np.dtype('l'))
+        sums = np.concatenate(([0], np.cumsum(daily)))
+        self._sums[genre] = (self.version, sums)
+        return sums
+
+    def _clip(self, ordinals):
+        # Day ordinals to positions in the prefix sums
+        import numpy as np
+
+        if self._origin is None:
+            return np.clip(ordinals, 0, 0)
+        return np.clip(np.asarray(ordinals) - self._origin, 0, self._length)
@@ -0,0 +1,39 @@
+"""Book identifiers.
+
+Every book has an integer ``id`` that never changes and is never reused.
+New ids are made of the milliseconds since 2020 and a counter that starts at
+a random value each millisecond, so they increase over time and rarely clash
+between processes sharing a library; ``Library`` still checks them against
+the journal under its write lock. They fit in 53 bits, so JavaScript (the
+browser side of the app) shows them exactly.
+
+Books in a ``library.json`` from before the journal, which had no ids, are
+numbered 1, 2, ... in the order they were added when it is first loaded.
+"""
+
+import random
+import threading
+import time
+
+EPOCH_MS = 1577836800000
+COUNTER_BITS = 12
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def new_id():
+    global _last_ms, _counter
+    with _lock:
+        now = int(time.time() * 1000) - EPOCH_MS
+        if now > _last_ms:
+            # Start in the lower half so bursts have room to count up
+            _last_ms, _counter = now, random.getrandbits(COUNTER_BITS - 1)
+        else:
+            # Same millisecond, or the clock went back: keep counting, and
+            # borrow the next millisecond when the counter runs out
+            _counter += 1
+            if _counter >> COUNTER_BITS:
+                _last_ms, _counter = _last_ms + 1, 0
+        return _last_ms << COUNTER_BITS | _counter
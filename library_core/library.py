@@ -0,0 +1,623 @@
+"""Python API for library operations, usable without Streamlit.
+
+    from library_core.library import Library
+
+    library = Library()
+    library.add({'title': 'Dune', 'author': 'Frank Herbert',
+                 'publication_year': 1965, 'genre': 'Science Fiction'})
+    library.mark_read('Dune')
+    print(library.summary())
+
+The search index, statistics and recommender are only built the first time they are
+used, so scripts that just add or remove books don't pay for them. The search
+index is built in the background (see ``build_search_index``).
+
+Every book has a stable integer ``id`` (see ``ids``); ``get`` looks one up
+and the bulk methods accept ids. Changes are journaled by id, so they apply
+to exactly the books the caller meant.
+
+Several Library objects (in other processes or Streamlit sessions) can share
+one store. Every change first catches up with what the others committed, and
+``refresh()`` does the same for readers. Books carry a ``version``; passing
+``expected_version`` to ``mark_read`` or ``remove`` raises ``ConflictError``
+if the book changed since the caller read it.
+
+Marking books read or unread is also logged with the date to the reading
+history (see ``history``), which backs ``read_date``, reading goals and
+trends. Books added as already read have no read date.
+
+A Library is safe to share between threads: reads and changes are serialized
+by a lock, so one instance can serve every session of a Streamlit server.
+
+With ``autosave_interval`` set, changes are applied in memory and their
+journal entries queued; a background writer flushes them in one batch after
+that many seconds (or ``autosave_batch`` changes). ``flush()``, ``save()``
+and ``close()`` write the queue immediately. SQLite libraries read the
+database in place and ignore it.
+"""
+
+import contextlib
+import threading
+import time
+from datetime import date, timedelta
+
+from library_core.backends import open_store
+from library_core.catalog import Backfill, Catalog, normalize
+from library_core.ids import new_id
+from library_core import metrics
+from library_core.storage import ConflictError
+from library_core.validation import parse_book, parse_changes, parse_goal
+
+
+class Library:
+    def __init__(self, store=None, books=None, autosave_interval=None, autosave_batch=100):
+        # Loads the books from the store unless they are given
+        self.store = store if store is not None else open_store()
+        self.catalog = self._open_catalog(books)
+        self._search_index = None
+        self._stats = None
+        self._recommender = None
+        self._recommender_version = None
+        self._history = None
+        self._lock = threading.RLock()
+        # Autosave queue: journal entries applied in memory but not written,
+        # the history events that go with them, whether other stores' changes
+        # were applied on top of them, and the books those changes added
+        self._pending = []
+        self._pending_history = []
+        self._diverged = False
+        self._foreign_adds = set()
+        self.autosave = None
+        # SQLite libraries read the database itself rather than a copy, so
+        # changes can't wait in a queue; they commit as they are made
+        if autosave_interval is not None and not self.read_only and not self._uses_sql():
+            from library_core.autosave import AutosaveWriter
+
+            self.autosave = AutosaveWriter(self.flush, lambda: len(self._pending), autosave_interval, autosave_batch)
+
+    def __len__(self):
+        return len(self.catalog)
+
+    def __iter__(self):
+        return iter(self.catalog)
+
+    def build_search_index(self):
+        # Starts indexing the books for search() in the background, unless
+        # that has started already, and returns the catalog.Backfill doing
+        # it. It takes the lock a chunk of books at a time, so other callers
+        # aren't held up for the whole build; the app starts it at load.
+        # SQLite and archives search in place and return None.
+        with self._lock:
+            if self._search_index is None and not self._uses_sql() and not self._is_mapped():
+                from library_core.search import SearchIndex
+
+                self._search_index = Backfill(self.catalog, SearchIndex(), self._lock)
+            return self._search_index
+
+    @property
+    def stats(self):
+        with self._lock:
+            if self._stats is None:
+                from library_core.stats import LibraryStats
+
+                self._stats = LibraryStats()
+                self.catalog.subscribe(self._stats)
+            return self._stats
+
+    @property
+    def recommender(self):
+        with self._lock:
+            if self._uses_sql() and self._recommender is not None and self._recommender_version != self.catalog.version:
+                self._recommender = None
+            if self._recommender is None:
+                from library_core.recommend import Recommender
+
+                self._recommender = Recommender()
+                if self._is_mapped() or self._uses_sql():
+                    # Archives don't change and SQLite keeps no copy to
+                    # listen to; the vectors come from packed columns (on
+                    # SQLite one scan of the table, redone after a change)
+                    catalog = self.catalog
+                    self._recommender_version = catalog.version
+                    self._recommender.add_packed(catalog.column('author'), catalog.strings('author'),
+                                                 catalog.column('genre'), catalog.strings('genre'),
+                                                 catalog.column('publication_year'), catalog.column('read_status'))
+                else:
+                    self.catalog.subscribe(self._recommender)
+            return self._recommender
+
+    @property
+    def history(self):
+        # Not reset by reloads: it is a separate log and ids don't change
+        with self._lock:
+            if self._pending_history:
+                # Include the reads autosave hasn't written yet
+                self.flush()
+            if self._history is None:
+                from library_core.history import ReadingHistory
+
+                path = getattr(self.store, 'path', None)
+                self._history = ReadingHistory(path + '.history' if path else None)
+            else:
+                self._history.poll()
+            return self._history
+
+    @property
+    def read_only(self):
+        return getattr(self.store, 'read_only', False)
+
+    def _uses_sql(self):
+        # SQLite libraries filter, page, search and aggregate in SQL
+        from library_core.sqlite_store import SqliteStore
+
+        return isinstance(self.store, SqliteStore)
+
+    def _is_mapped(self):
+        # Memory-mapped archives search and aggregate over the file itself
+        from library_core.mapped import MappedStore
+
+        return isinstance(self.store, MappedStore)
+
+    def _open_catalog(self, books=None):
+        # Archives and SQLite databases are read in place; other stores are
+        # loaded into an in-memory Catalog
+        if books is None and hasattr(self.store, 'open_catalog'):
+            return self.store.open_catalog()
+        if books is None:
+            return Catalog(self.store.load())
+        return Catalog(book if 'id' in book else dict(book, id=new_id()) for book in books)
+
+    @metrics.timed('library.refresh')
+    def refresh(self):
+        # Applies changes other stores committed since the last call and
+        # returns how many there were (-1 if the library had to be reloaded)
+        with self._lock:
+            return self._catch_up(self.store.changes())
+
+    def get(self, book_id):
+        # The book with this id, or None
+        with self._lock:
+            key = self.catalog.key_for_id(book_id)
+            return self.catalog.get(key) if key is not None else None
+
+    def add(self, book):
+        # Validates and adds one book and returns its id; raises ValueError
+        # if it is invalid or already in the library
+        book = parse_book(book)
+        with self._writing():
+            if self.catalog.contains(book['title'], book['author']):
+                raise ValueError(f"'{book['title']}' by {book['author']} is already in your library!")
+            book = {'id': self._new_id(), **book}
+            seq = self._record({'op': 'add', 'book': book})
+            self.catalog.add(_versioned(book, seq))
+            return book['id']
+
+    def mark_read(self, title, expected_version=None):
+        # Returns the book marked as read, or None if no book has this title
+        with self._writing():
+            keys = self.catalog.keys_for_title(title)
+            if not keys:
+                return None
+            self._check_version(keys[:1], expected_version)
+            events = self._read_events(keys[:1], True)
+            seq = self._record({'op': 'update', 'ids': self._ids(keys[:1]), 'fields': {'read_status': True}})
+            book = self.catalog.update(keys[0], **_versioned({'read_status': True}, seq))
+            self._record_history(events)
+            return book
+
+    def remove(self, title, expected_version=None):
+        # Removes every book with this title and returns how many there were
+        with self._writing():
+            keys = self.catalog.keys_for_title(title)
+            if not keys:
+                return 0
+            self._check_version(keys, expected_version)
+            self._record({'op': 'remove', 'ids': self._ids(keys)})
+            for key in keys:
+                self.catalog.remove(key)
+            return len(keys)
+
+    def select(self, read_status=None, genres=None, authors=None, min_year=None, max_year=None):
+        # Books matching every given criterion, in the order they were added;
+        # e.g. all unread Fantasy before 1950 is
+        # select(False, genres=['Fantasy'], max_year=1949)
+        with self._lock:
+            keys = self.catalog.select(read_status, genres, authors, min_year, max_year)
+            return [self.catalog.get(int(key)) for key in keys]
+
+    def count_matching(self, read_status=None, genres=None, authors=None, min_year=None, max_year=None):
+        # len(select(...)) without building the book dicts
+        with self._lock:
+            return len(self.catalog.select(read_status, genres, authors, min_year, max_year))
+
+    def update_books(self, books, **fields):
+        # Sets publication_year, genre and/or read_status on many books with
+        # one journal entry and returns how many changed. books are ids, book
+        # dicts or (title, author) pairs; a dict's version is checked like
+        # expected_version.
+        fields = parse_changes(fields)
+        with self._writing():
+            keys = self._resolve(books)
+            if not keys:
+                return 0
+            events = self._read_events(keys, fields['read_status'], fields.get('genre')) if 'read_status' in fields else []
+            seq = self._record({'op': 'update', 'ids': self._ids(keys), 'fields': fields})
+            for key in keys:
+                self.catalog.update(key, **_versioned(fields, seq))
+            self._record_history(events)
+            return len(keys)
+
+    def remove_books(self, books):
+        # Removes many books with one journal entry and returns how many
+        with self._writing():
+            keys = self._resolve(books)
+            if not keys:
+                return 0
+            self._record({'op': 'remove', 'ids': self._ids(keys)})
+            for key in keys:
+                self.catalog.remove(key)
+            return len(keys)
+
+    def contains(self, title, author):
+        return self.catalog.contains(title, author)
+
+    @metrics.timed('search')
+    def search(self, query, field=None, limit=None):
+        # Ranked full-text search, or SQL substring search on SQLite
+        if self._uses_sql():
+            return self.store.search(query, field=field, limit=limit)
+        if self._is_mapped():
+            with self._lock:
+                return [self.catalog.get(key) for key in self.catalog.search(query, field=field, limit=limit)]
+        while True:
+            # Waits for the index without holding the lock
+            backfill = self.build_search_index()
+            index = backfill.wait()
+            with self._lock:
+                # A reload meanwhile replaced the catalog and its index
+                if self._search_index is backfill:
+                    return [self.catalog.get(key) for key in index.search(query, field=field, limit=limit)]
+
+    @metrics.timed('filter.count')
+    def count(self, read_status=None):
+        if self._uses_sql():
+            return self.store.count(read_status=read_status)
+        # Just the two counters; summary() copies the per-genre, year and
+        # author tables for callers that iterate them
+        with self._lock:
+            if self._is_mapped():
+                total, read = len(self.catalog), self.catalog.read_count()
+            else:
+                total, read = self.stats.total, self.stats.read
+        if read_status is None:
+            return total
+        return read if read_status else total - read
+
+    @metrics.timed('filter.page')
+    def page(self, read_status=None, page=1, page_size=None, sort_by=None, descending=False):
+        # Returns one page of books with the given read status (all of them
+        # without page_size)
+        if self._uses_sql():
+            # Let SQLite do the filtering, sorting and paging using its indexes
+            offset = (page - 1) * page_size if page_size else 0
+            return self.store.books(read_status=read_status, order_by=sort_by or 'id', descending=descending, limit=page_size, offset=offset)
+        # Vectorized filter and sort over the catalog's columns; only the rows
+        # on the requested page are turned back into book dicts
+        with self._lock:
+            keys = self.catalog.rows(read_status=read_status, sort_by=sort_by, descending=descending)
+            if page_size is not None:
+                keys = keys[(page - 1) * page_size:page * page_size]
+            return [self.catalog.get(int(key)) for key in keys]
+
+    @metrics.timed('stats')
+    def summary(self):
+        if self._is_mapped() or self._uses_sql():
+            with self._lock:
+                return self.catalog.summary()
+        with self._lock:
+            return self.stats.summary()
+
+    def read_date(self, book_id):
+        # The date the book was last marked read, or None
+        with self._lock:
+            return self.history.read_date(book_id)
+
+    def set_goal(self, period, target, genre=None):
+        # Sets the books-per-period goal ('week', 'month' or 'year'),
+        # optionally for one genre; a target of 0 removes it
+        goal = parse_goal(period, target, genre)
+        with self._writing():
+            self.history.record([goal])
+
+    @metrics.timed('history.goals')
+    def goal_progress(self, today=None):
+        # Every goal with 'read' (books read so far this period), 'target',
+        # 'expected' (where a steady pace would be by today) and the period's
+        # 'start' and 'end' dates
+        with self._lock:
+            return self.history.progress(today)
+
+    @metrics.timed('history.trend')
+    def reading_trend(self, days=365, window=30, today=None, genre=None):
+        # (date, books read in the window days up to it) for each of the
+        # last days days
+        end = today or date.today()
+        start = end - timedelta(days=days - 1)
+        with self._lock:
+            counts = self.history.rolling(window, start, end, genre)
+        return [(start + timedelta(days=offset), count) for offset, count in enumerate(counts.tolist())]
+
+    @metrics.timed('history.months')
+    def reads_per_month(self, genre=None):
+        # (first day of the month, books read) over the whole history
+        with self._lock:
+            return self.history.per_month(genre=genre)
+
+    @metrics.timed('recommend')
+    def recommend(self, limit=10):
+        # Up to limit unread books most like the ones already read, each with
+        # a 'score' (cosine similarity, 0 to 1); empty until a book is read
+        with self._lock:
+            results = self.recommender.recommend(limit)
+            if self._uses_sql():
+                # The recommender's keys are rows of the scanned columns
+                ids = self.catalog.column('id')
+                results = [(int(ids[key]), score) for key, score in results]
+            return [dict(self.catalog.get(key), score=score) for key, score in results]
+
+    def save(self):
+        with self._lock, self.store.locked() as changes:
+            self._catch_up(changes)
+            # Queued changes go to the journal first so other stores see them
+            self._flush_pending()
+            if isinstance(self.catalog, Catalog):
+                # Catalogs read in place (SQLite) have nothing to write back
+                self.store.save(self.catalog.books())
+
+    @metrics.timed('autosave.flush')
+    def flush(self):
+        # Writes the changes queued by autosave and returns how many
+        with self._lock:
+            if not self._pending and not self._pending_history:
+                return 0
+            with self.store.locked() as changes:
+                self._catch_up(changes)
+                return self._flush_pending()
+
+    def autosave_status(self):
+        # {'pending', 'last_flush', 'last_error'}, or None without autosave
+        return self.autosave.status() if self.autosave is not None else None
+
+    def import_file(self, source, fmt=None, chunk_size=10000, progress=None):
+        from library_core.bulk import detect_format, import_books
+
+        fmt = fmt or detect_format(getattr(source, 'name', source))
+        result = import_books(source, fmt, self._commit_batch, chunk_size, progress)
+        self.store.compact()
+        return result
+
+    def export_file(self, target, fmt=None, chunk_size=10000):
+        from library_core.bulk import detect_format, export_books
+
+        fmt = fmt or detect_format(getattr(target, 'name', target))
+        with self._lock:
+            export_books(iter(self.catalog), target, fmt, chunk_size)
+
+    def close(self):
+        if self.autosave is not None:
+            self.autosave.close()
+        self.store.close()
+
+    def _commit_batch(self, books):
+        # Adds the books that aren't in the library yet in one journal write
+        # and returns how many were added
+        with self._lock, self.store.locked() as changes:
+            self._catch_up(changes)
+            self._flush_pending()
+            books = [{'id': self._new_id(), **book} for book in books if not self.catalog.contains(book['title'], book['author'])]
+            if not books:
+                return 0
+            seq = self.store.append_many([{'op': 'add', 'book': book} for book in books])
+            first = seq - len(books) + 1 if seq is not None else None
+            for offset, book in enumerate(books):
+                self.catalog.add(_versioned(book, first + offset if first is not None else None))
+            return len(books)
+
+    @contextlib.contextmanager
+    def _writing(self):
+        # Catches up with other stores before a change. Without autosave the
+        # store's write lock is held until the change is journaled.
+        if self.autosave is None:
+            with self._lock, self.store.locked() as changes:
+                self._catch_up(changes)
+                yield
+        else:
+            with self._lock:
+                self._catch_up(self.store.changes())
+                yield
+
+    def _record(self, op):
+        # Journals a change, or queues it with autosave; returns its sequence
+        # number when it is known
+        if self.autosave is None:
+            return self.store.append(op)
+        self._pending.append(op)
+        self.autosave.mark_dirty()
+        return None
+
+    def _record_history(self, events):
+        # Logs read-status changes after their journal entry; with autosave
+        # they wait for the flush that writes it
+        if self.autosave is None:
+            self.history.record(events)
+        else:
+            now = round(time.time(), 3)
+            self._pending_history.extend(dict(event, t=now) for event in events)
+
+    def _flush_pending(self):
+        # Appends the queued changes in one batch, then their history events,
+        # so the history never has a read the journal doesn't; call with the
+        # store locked
+        if not self._pending and not self._pending_history:
+            return 0
+        # A book another store added meanwhile is already in the journal
+        ops = [op for op in self._pending
+               if op['op'] != 'add' or (normalize(op['book']['title']), normalize(op['book']['author'])) not in self._foreign_adds]
+        seq = self.store.append_many(ops) if ops else None
+        self._pending, self._foreign_adds = [], set()
+        events, self._pending_history = self._pending_history, []
+        self.history.record(events)
+        metrics.count('autosave.flushed', len(ops))
+        if self._diverged:
+            # Other stores' changes were applied after ours in memory but come
+            # first in the journal; reload to match the journal's order
+            self._diverged = False
+            self._reload()
+        elif seq is not None:
+            for offset, op in enumerate(ops, seq - len(ops) + 1):
+                self._set_version(op, offset)
+        return len(ops)
+
+    def _set_version(self, op, seq):
+        if op['op'] == 'add':
+            ids = [op['book']['id']]
+        elif op['op'] == 'update':
+            ids = op['ids']
+        else:
+            ids = []
+        for book_id in ids:
+            key = self.catalog.key_for_id(book_id)
+            if key is not None:
+                self.catalog.set_version(key, seq)
+
+    def _catch_up(self, changes):
+        # changes is what store.locked()/changes() returned: a list of journal
+        # entries to replay, or None when the store can't tell what changed
+        if self._pending and changes != []:
+            self._diverged = True
+            self._foreign_adds.update((normalize(entry['book']['title']), normalize(entry['book']['author']))
+                                      for entry in changes or () if entry['op'] == 'add')
+        if changes is None:
+            metrics.count('library.reloads')
+            self._reload()
+            # Keep showing the changes that are still queued; a queued book
+            # whose id another store has used since gets a new one
+            for op in self._pending:
+                if op['op'] != 'add':
+                    self._apply_entry(dict(op, seq=0))
+                    continue
+                if self.catalog.key_for_id(op['book']['id']) is not None:
+                    self._reassign_pending(op['book']['id'])
+                self.catalog.add(dict(op['book'], version=0))
+            return -1
+        for entry in changes:
+            self._apply_entry(entry)
+        if changes:
+            metrics.count('library.changes_applied', len(changes))
+        return len(changes)
+
+    def _apply_entry(self, entry):
+        # Same semantics as storage.apply_op, on the catalog
+        op = entry['op']
+        if op == 'add':
+            # The journal comes first: a book still queued here with the same
+            # id moves to a new one; otherwise the first add wins, as in
+            # apply_op
+            book_id = entry['book']['id']
+            new = self._reassign_pending(book_id)
+            key = self.catalog.key_for_id(book_id)
+            if key is not None:
+                if new is None:
+                    return
+                self.catalog.set_id(key, new)
+            self.catalog.add(dict(entry['book'], version=entry['seq']))
+        elif op == 'update':
+            for key in self._keys(entry['ids']):
+                self.catalog.update(key, **entry['fields'], version=entry['seq'])
+        elif op == 'remove':
+            for key in self._keys(entry['ids']):
+                self.catalog.remove(key)
+        else:
+            raise ValueError(f"Unknown journal operation: {op!r}")
+
+    def _reload(self):
+        self.catalog = self._open_catalog()
+        if self._search_index is not None:
+            # Searches are in use: start indexing the new catalog right away
+            self._search_index.cancel()
+            self._search_index = None
+            self.build_search_index()
+        self._stats = None
+        self._recommender = None
+
+    def _read_events(self, keys, read_status, genre=None):
+        # History events for the books whose read status this change flips
+        events = []
+        for key in keys:
+            book = self.catalog.get(key)
+            if book['read_status'] != read_status:
+                events.append({'id': book['id'], 'genre': genre or book['genre'], 'read': read_status})
+        return events
+
+    def _resolve(self, books):
+        # The keys of the given books that are in the library, once each,
+        # checking the versions of book dicts
+        keys = {}
+        for book in books:
+            version = None
+            if isinstance(book, int):
+                found = self._keys([book])
+            elif isinstance(book, dict):
+                version = book.get('version')
+                found = self._keys([book['id']]) if 'id' in book else self.catalog.keys_for_book(book['title'], book['author'])
+            else:
+                found = self.catalog.keys_for_book(*book)
+            self._check_version(found, version)
+            keys.update(dict.fromkeys(found))
+        return list(keys)
+
+    def _keys(self, ids):
+        keys = (self.catalog.key_for_id(book_id) for book_id in ids)
+        return [key for key in keys if key is not None]
+
+    def _ids(self, keys):
+        return [self.catalog.id_of(key) for key in keys]
+
+    def _reassign_pending(self, book_id):
+        # Gives the queued book with this id a new one, in its add and in the
+        # queued changes and history events naming it; None if no queued add
+        # has this id
+        if not any(op['op'] == 'add' and op['book']['id'] == book_id for op in self._pending):
+            return None
+        new = self._new_id()
+        for op in self._pending:
+            if op['op'] == 'add' and op['book']['id'] == book_id:
+                op['book'] = dict(op['book'], id=new)
+            elif op['op'] != 'add' and book_id in op['ids']:
+                op['ids'] = [new if i == book_id else i for i in op['ids']]
+        for event in self._pending_history:
+            if event.get('id') == book_id:
+                event['id'] = new
+        return new
+
+    def _new_id(self):
+        # Unique among the books this library has seen. Without autosave ids
+        # are made under the write lock after catching up, so that is every
+        # book; queued books are checked again when other stores' changes
+        # come in (see _apply_entry).
+        book_id = new_id()
+        while self.catalog.key_for_id(book_id) is not None:
+            book_id = new_id()
+        return book_id
+
+    def _check_version(self, keys, expected_version):
+        if expected_version is None:
+            return
+        for key in keys:
+            if self.catalog.get(key)['version'] != expected_version:
+                raise ConflictError(f"'{self.catalog.get(key)['title']}' was changed by another session; review it and try again.")
+
+
+def _versioned(book, seq):
+    # Stores without sequence numbers (SQLite) return None from append
+    return book if seq is None else dict(book, version=seq)
@@ -0,0 +1,359 @@
+"""Read-only, memory-mapped access to binary snapshots.
+
+A binary snapshot (see ``codec``) is opened with mmap and its columns are
+used in place as NumPy arrays, so opening takes the same time for any size
+and only the pages a view touches are read: a page of books decodes just
+those titles, title lookups binary-search the stored title order, and
+counts and statistics run over the packed columns. Build an archive from a
+JSON library with::
+
+    python -m library_core.mapped library.json library.bin
+
+and open it with ``LIBRARY_BACKEND=mmap LIBRARY_PATH=library.bin``. Snapshots
+written with ``LIBRARY_SNAPSHOT_FORMAT=binary`` can be opened directly, but
+journal entries not yet folded into them are not visible.
+"""
+
+import bisect
+import heapq
+import mmap
+import os
+import re
+import sys
+
+from library_core import codec
+from library_core.catalog import normalize
+from library_core.metrics import timed
+
+_DTYPES = {'id': '<i8', 'author': '<u4', 'genre': '<u2', 'publication_year': '<i2', 'version': '<i8', 'read_status': '?'}
+
+
+class ReadOnlyError(ValueError):
+    pass
+
+
+class MappedCatalog:
+    # Same read interface as catalog.Catalog; keys are row numbers in the file
+    def __init__(self, path):
+        import numpy as np
+
+        with open(path, 'rb') as file:
+            try:
+                self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:
+                # Empty file
+                raise codec.CorruptSnapshotError(f"{path} is not a binary snapshot") from e
+        if not codec.is_binary(self._map[:len(codec.MAGIC)]):
+            self._map.close()
+            raise codec.CorruptSnapshotError(f"{path} is not a binary snapshot; convert it with python -m library_core.mapped")
+        self.seq, self._count, sections = codec.snapshot_layout(self._map)
+        self._tables = {}
+        for table in ('author_table', 'genre_table', 'title'):
+            n, offsets_at, text_at = sections[table]
+            self._tables[table] = (np.frombuffer(self._map, '<u8', n + 1, offsets_at), text_at)
+        self._columns = {field: np.frombuffer(self._map, dtype, self._count, sections[field])
+                         for field, dtype in _DTYPES.items()}
+        self._title_order = np.frombuffer(self._map, '<u4', self._count, sections['title_order'])
+        # Authors and genres are decoded once each, on first use
+        self._strings = {'author_table': {}, 'genre_table': {}}
+        self._orders = {}
+        self._id_order = None
+        self._summary = None
+        self._read_count = None
+        self.version = 0
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return (self._book(key) for key in range(self._count))
+
+    def __reversed__(self):
+        return (self._book(key) for key in range(self._count - 1, -1, -1))
+
+    def books(self):
+        return list(self)
+
+    def keys(self):
+        return range(self._count)
+
+    def get(self, key):
+        if 0 <= key < self._count:
+            return self._book(key)
+        return None
+
+    def key_for_id(self, book_id):
+        import numpy as np
+
+        if self._id_order is None:
+            # Ids only increase, so this is usually already sorted
+            order = np.argsort(self._columns['id'], kind='stable')
+            self._id_order = (order, self._columns['id'][order])
+        order, ids = self._id_order
+        i = int(ids.searchsorted(np.int64(book_id)))
+        if i < self._count and ids[i] == book_id:
+            return int(order[i])
+        return None
+
+    def id_of(self, key):
+        return int(self._columns['id'][key])
+
+    def keys_for_title(self, title):
+        # Binary search over the stored title order, decoding ~log2(n) titles
+        title = normalize(title)
+        order = self._title_order
+        start = bisect.bisect_left(order, title, key=self._normalized_title)
+        end = start
+        while end < len(order) and self._normalized_title(order[end]) == title:
+            end += 1
+        return [int(key) for key in order[start:end]]
+
+    def contains(self, title, author):
+        author = normalize(author)
+        return any(normalize(self._string('author_table', int(self._columns['author'][key]))) == author
+                   for key in self.keys_for_title(title))
+
+    def rows(self, read_status=None, sort_by=None, descending=False):
+        import numpy as np
+
+        if sort_by is None:
+            if read_status is None:
+                keys = np.arange(self._count)
+            else:
+                read = self._columns['read_status']
+                keys = np.flatnonzero(read if read_status else ~read)
+        else:
+            keys = self._order(sort_by)
+            if read_status is not None:
+                keys = keys[self._columns['read_status'][keys] == bool(read_status)]
+        if descending:
+            keys = keys[::-1]
+        return keys
+
+    def select(self, read_status=None, genres=None, authors=None, min_year=None, max_year=None):
+        import numpy as np
+
+        columns = self._columns
+        mask = np.ones(self._count, dtype=np.bool_)
+        if read_status is not None:
+            mask &= columns['read_status'] == bool(read_status)
+        if genres is not None:
+            mask &= np.isin(columns['genre'], self._codes('genre', genres, str))
+        if authors is not None:
+            mask &= np.isin(columns['author'], self._codes('author', authors, normalize))
+        if min_year is not None:
+            mask &= columns['publication_year'] >= min_year
+        if max_year is not None:
+            mask &= columns['publication_year'] <= max_year
+        return np.flatnonzero(mask)
+
+    def read_count(self):
+        import numpy as np
+
+        if self._read_count is None:
+            self._read_count = int(np.count_nonzero(self._columns['read_status']))
+        return self._read_count
+
+    def summary(self):
+        # Computed from the packed columns once; the file never changes
+        import numpy as np
+
+        if self._summary is None:
+            read = self.read_count()
+            years, year_counts = np.unique(self._columns['publication_year'], return_counts=True)
+            self._summary = {
+                'total': self._count,
+                'read': read,
+                'percent_read': read / self._count * 100 if self._count else 0,
+                'genres': self._code_counts('genre'),
+                'years': dict(zip(years.tolist(), year_counts.tolist())),
+                'authors': self._code_counts('author'),
+            }
+        summary = dict(self._summary)
+        for field in ('genres', 'years', 'authors'):
+            summary[field] = dict(summary[field])
+        return summary
+
+    def search(self, query, field=None, limit=None):
+        # Case-insensitive substring search (ASCII case folding) scanning
+        # the string tables in the file; every word of the query must occur
+        # in one of the searched fields. Returns keys in file order.
+        import numpy as np
+
+        words = normalize(query).split()
+        if not words:
+            return []
+        fields = (field,) if field else ('title', 'author', 'genre')
+        streams = []
+        if 'title' in fields:
+            streams.append(self._matches('title', words[0]))
+        for name in ('author', 'genre'):
+            if name in fields:
+                codes = list(self._matches(f'{name}_table', words[0]))
+                if codes:
+                    streams.append(map(int, np.flatnonzero(np.isin(self._columns[name], codes))))
+        results = []
+        previous = None
+        for key in heapq.merge(*streams):
+            if key == previous:
+                continue
+            previous = key
+            if len(words) > 1:
+                book = self._book(key)
+                text = ' '.join(normalize(book[name]) for name in fields)
+                if not all(word in text for word in words[1:]):
+                    continue
+            results.append(key)
+            if limit is not None and len(results) >= limit:
+                break
+        return results
+
+    def column(self, field):
+        # A packed column as a read-only NumPy array over the file
+        return self._columns[field]
+
+    def strings(self, field):
+        # The author or genre table, indexed by the codes in column(field)
+        table = f'{field}_table'
+        return [self._string(table, code) for code in range(len(self._tables[table][0]) - 1)]
+
+    def close(self):
+        # Drops the catalog's own views first; if a caller still holds a
+        # column the map stays open until that goes too
+        self._columns = self._tables = self._title_order = self._id_order = None
+        try:
+            self._map.close()
+        except BufferError:
+            pass
+
+    def _book(self, key):
+        columns = self._columns
+        return {
+            'id': int(columns['id'][key]),
+            'title': self._string('title', key),
+            'author': self._string('author_table', int(columns['author'][key])),
+            'publication_year': int(columns['publication_year'][key]),
+            'genre': self._string('genre_table', int(columns['genre'][key])),
+            'read_status': bool(columns['read_status'][key]),
+            'version': int(columns['version'][key]),
+        }
+
+    def _string(self, table, index):
+        cache = self._strings.get(table)
+        if cache is not None and index in cache:
+            return cache[index]
+        offsets, text_at = self._tables[table]
+        text = self._map[text_at + int(offsets[index]):text_at + int(offsets[index + 1])].decode('utf-8')
+        if cache is not None:
+            cache[index] = text
+        return text
+
+    def _normalized_title(self, key):
+        return normalize(self._string('title', int(key)))
+
+    def _order(self, field):
+        import numpy as np
+
+        if field == 'title':
+            return self._title_order
+        if field not in self._orders:
+            if field in ('author', 'genre'):
+                table = f'{field}_table'
+                strings = [self._string(table, code) for code in range(len(self._tables[table][0]) - 1)]
+                order = sorted(range(len(strings)), key=lambda code: strings[code].lower())
+                ranks = np.empty(len(strings), dtype=np.int64)
+                ranks[order] = np.arange(len(strings))
+                column = ranks[self._columns[field]]
+            else:
+                column = self._columns[field]
+            self._orders[field] = np.argsort(column, kind='stable')
+        return self._orders[field]
+
+    def _codes(self, field, names, fold):
+        table = f'{field}_table'
+        names = {fold(name) for name in names}
+        return [code for code in range(len(self._tables[table][0]) - 1) if fold(self._string(table, code)) in names]
+
+    def _code_counts(self, field):
+        import numpy as np
+
+        counts = np.bincount(self._columns[field])
+        return {self._string(f'{field}_table', code): int(n) for code, n in enumerate(counts.tolist()) if n}
+
+    def _matches(self, table, word):
+        # Indexes of the strings in a table that contain word
+        import numpy as np
+
+        offsets, text_at = self._tables[table]
+        pattern = re.compile(re.escape(word.encode('utf-8')), re.IGNORECASE)
+        previous = -1
+        for match in pattern.finditer(self._map, text_at, text_at + int(offsets[-1])):
+            # The offsets are uint64; a plain int would make NumPy convert them all
+            index = int(offsets.searchsorted(np.uint64(match.start() - text_at), side='right')) - 1
+            # Skip repeats and matches running into the next string
+            if index != previous and match.end() - text_at <= offsets[index + 1]:
+                previous = index
+                yield index
+
+
+class MappedStore:
+    # Read-only store over a binary snapshot
+    read_only = True
+
+    def __init__(self, path='library.bin'):
+        self.path = path
+        self._identity = None
+        self._catalog = None
+
+    @timed('storage.load')
+    def open_catalog(self):
+        self._identity = self._stat()
+        self._catalog = MappedCatalog(self.path)
+        return self._catalog
+
+    def load(self):
+        return self.open_catalog().books()
+
+    def changes(self):
+        # None once the file has been replaced, so the Library reopens it
+        return None if self._stat() != self._identity else []
+
+    def locked(self):
+        raise ReadOnlyError("This library is a read-only archive; changes are disabled.")
+
+    def append(self, op):
+        self.locked()
+
+    def append_many(self, ops):
+        self.locked()
+
+    def save(self, library):
+        self.locked()
+
+    def compact(self, wait=False):
+        pass
+
+    def close(self):
+        # The map stays valid for views still in use; it closes with them
+        self._catalog = None
+
+    def _stat(self):
+        stat = os.stat(self.path)
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def build_archive(source='library.json', target='library.bin'):
+    # Writes a JSON-journal library (snapshot plus journal) as a binary
+    # snapshot that can be opened with MappedStore
+    from library_core.storage import JournalStore, atomic_write
+
+    store = JournalStore(source)
+    books = store.load()
+    atomic_write(target, codec.dumps_snapshot(books, store.seq, 'binary'))
+    return len(books)
+
+
+if __name__ == '__main__':
+    source = sys.argv[1] if len(sys.argv) > 1 else 'library.json'
+    target = sys.argv[2] if len(sys.argv) > 2 else 'library.bin'
+    print(f"Wrote {build_archive(source, target)} books from {source} to {target}")
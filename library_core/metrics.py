@@ -0,0 +1,210 @@
+"""Opt-in timing and counters for the library's hot paths.
+
+Set ``LIBRARY_METRICS`` to turn it on:
+
+- ``1``: collect metrics (the app shows them in a sidebar panel)
+- a path ending in ``.prom``: also rewrite that file in the Prometheus text
+  format after every rerun (for node_exporter's textfile collector)
+- any other path: also append one JSON line per rerun to that file
+
+Operations are timed with ``timed(name)``, as a decorator or a ``with``
+block; times are inclusive, so nested operations overlap. ``begin()`` and
+``end()`` bracket one rerun on the current thread and ``end()`` returns its
+breakdown. While disabled, ``timed`` and ``count`` only check a flag.
+"""
+
+import collections
+import functools
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+# Histogram buckets in seconds, as in the Prometheus client libraries
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Reruns kept for the percentiles in the panel
+RECENT_RERUNS = 1000
+
+_enabled = False
+_export_path = None
+_lock = threading.Lock()
+_local = threading.local()
+_operations = {}
+_counters = collections.Counter()
+_reruns = None
+_recent = collections.deque(maxlen=RECENT_RERUNS)
+
+
+class _Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.count += 1
+        self.sum += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+
+def configure(setting=None):
+    # Applies a LIBRARY_METRICS value (read from the environment by default)
+    global _enabled, _export_path
+    setting = os.environ.get('LIBRARY_METRICS', '') if setting is None else setting
+    _enabled = setting not in ('', '0')
+    _export_path = setting if _enabled and setting != '1' else None
+
+
+def enabled():
+    return _enabled
+
+
+class timed:
+    # Times a block or, used as a decorator, every call of a function
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        if _enabled:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if _enabled:
+            _observe(self.name, time.perf_counter() - self.start)
+
+    def __call__(self, function):
+        name = self.name
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _observe(name, time.perf_counter() - start)
+        return wrapper
+
+
+def count(name, n=1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] += n
+    current = getattr(_local, 'rerun', None)
+    if current is not None:
+        current['counters'][name] = current['counters'].get(name, 0) + n
+
+
+def begin():
+    # Starts recording a rerun on this thread, dropping any unfinished one
+    _local.rerun = {'start': time.perf_counter(), 'operations': {}, 'counters': {}} if _enabled else None
+
+
+def end(**labels):
+    # Finishes this thread's rerun, exports it and returns its record (None
+    # while disabled)
+    global _reruns
+    current = getattr(_local, 'rerun', None)
+    _local.rerun = None
+    if current is None:
+        return None
+    seconds = time.perf_counter() - current['start']
+    record = {
+        'time': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+        'seconds': seconds,
+        **labels,
+        'operations': {name: {'calls': calls, 'seconds': total} for name, (calls, total) in current['operations'].items()},
+        'counters': current['counters'],
+    }
+    with _lock:
+        if _reruns is None:
+            _reruns = _Histogram()
+        _reruns.observe(seconds)
+        _recent.append(seconds)
+    if _export_path:
+        _export(record)
+    return record
+
+
+def rerun_percentiles(percentiles=(50, 95, 99)):
+    # Nearest-rank percentiles of the recent rerun latencies, in seconds
+    with _lock:
+        recent = sorted(_recent)
+    if not recent:
+        return {}
+    return {p: recent[min(len(recent) - 1, int(len(recent) * p / 100))] for p in percentiles}
+
+
+def totals():
+    # Process-wide {operation: (calls, seconds)} and counters
+    with _lock:
+        return ({name: (h.count, h.sum) for name, h in _operations.items()}, dict(_counters))
+
+
+def prometheus_text():
+    lines = []
+    with _lock:
+        lines += ['# HELP library_operation_seconds Time spent in instrumented library operations.',
+                  '# TYPE library_operation_seconds histogram']
+        for name, histogram in sorted(_operations.items()):
+            lines += _histogram_lines('library_operation_seconds', histogram, f'operation="{name}",')
+        if _reruns is not None:
+            lines += ['# HELP library_rerun_seconds Duration of app reruns.',
+                      '# TYPE library_rerun_seconds histogram']
+            lines += _histogram_lines('library_rerun_seconds', _reruns, '')
+        lines += ['# HELP library_events_total Counted library events.',
+                  '# TYPE library_events_total counter']
+        lines += [f'library_events_total{{event="{name}"}} {n}' for name, n in sorted(_counters.items())]
+    return '\n'.join(lines) + '\n'
+
+
+def _histogram_lines(metric, histogram, labels):
+    lines = []
+    cumulative = 0
+    for bound, n in zip(BUCKETS, histogram.buckets):
+        cumulative += n
+        lines.append(f'{metric}_bucket{{{labels}le="{bound}"}} {cumulative}')
+    lines.append(f'{metric}_bucket{{{labels}le="+Inf"}} {histogram.count}')
+    labels = labels.rstrip(',')
+    suffix = f'{{{labels}}}' if labels else ''
+    lines.append(f'{metric}_sum{suffix} {histogram.sum}')
+    lines.append(f'{metric}_count{suffix} {histogram.count}')
+    return lines
+
+
+def _observe(name, seconds):
+    with _lock:
+        histogram = _operations.get(name)
+        if histogram is None:
+            histogram = _operations[name] = _Histogram()
+        histogram.observe(seconds)
+    current = getattr(_local, 'rerun', None)
+    if current is not None:
+        calls, total = current['operations'].get(name, (0, 0.0))
+        current['operations'][name] = (calls + 1, total + seconds)
+
+
+def _export(record):
+    try:
+        if _export_path.endswith('.prom'):
+            from library_core.storage import atomic_write
+
+            atomic_write(_export_path, prometheus_text())
+        else:
+            with open(_export_path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(record) + '\n')
+    except OSError:
+        # Metrics must never break the app
+        pass
+
+
+configure()
@@ -0,0 +1,29 @@
+"""Server-side pagination so views only materialize the visible rows."""
+
+import heapq
+import itertools
+
+
+def _sort_key(field):
+    def key(book):
+        value = book[field]
+        return value.lower() if isinstance(value, str) else value
+    return key
+
+
+def page_count(total, page_size):
+    return max(1, -(-total // page_size))
+
+
+def page_slice(books, page, page_size, sort_by=None, descending=False):
+    # Returns the books on a 1-based page. Without sort_by books keep their
+    # existing order (reversed when descending) and only the rows up to the
+    # end of the page are walked; sorted pages keep a bounded heap of the
+    # first page * page_size books instead of sorting everything.
+    start = (page - 1) * page_size
+    if sort_by is None:
+        if descending:
+            books = reversed(books)
+        return list(itertools.islice(books, start, start + page_size))
+    select = heapq.nlargest if descending else heapq.nsmallest
+    return select(start + page_size, books, key=_sort_key(sort_by))[start:]
@@ -0,0 +1,209 @@
+"""Offline recommendations from reading history.
+
+Every book is a sparse vector over its author, genre, publication decade and
+title words, each feature weighted by its kind and by how rare it is in the
+library (inverse document frequency). The reader's profile is the sum of the
+vectors of the books they have read, and unread books are ranked by their
+cosine similarity to it.
+
+The vectors are kept as a flat array of feature codes, with the key of the
+book each belongs to alongside, maintained by a catalog listener as books
+change together with per-feature book counts. Scoring is then a gather and
+a weighted bincount per term over those arrays in NumPy (a sparse
+matrix-vector product without SciPy); the result is cached until the
+library changes.
+"""
+
+import math
+from array import array
+
+from library_core.catalog import normalize
+from library_core.search import tokenize
+
+# Weight of each kind of feature in the vectors
+FEATURE_WEIGHTS = {'author': 3.0, 'genre': 1.0, 'decade': 0.5, 'title': 1.0}
+_KINDS = list(FEATURE_WEIGHTS)
+
+
+class Recommender:
+    # Catalog listener; keys are catalog keys
+    def __init__(self):
+        self._codes = {}               # (kind, value) -> feature code
+        self._kinds = array('B')       # feature code -> index into _KINDS
+        self._books = array('q')       # feature code -> books with it
+        self._read_books = array('q')  # feature code -> read books with it
+        self._features = array('I')    # every book's feature codes, back to back
+        self._owners = array('I')      # key + 1 of the book each code belongs to, 0 once dropped
+        self._starts = array('q')      # key -> start of its codes in _features
+        self._lengths = array('H')     # key -> number of codes
+        self._read = bytearray()
+        self._alive = bytearray()
+        self._live_features = 0
+        self.total = 0
+        self.read = 0
+        self._version = 0
+        self._cache = None
+
+    def added(self, key, book):
+        if key >= len(self._starts):
+            grow = key + 1 - len(self._starts)
+            self._starts.extend([0] * grow)
+            self._lengths.extend([0] * grow)
+            self._read.extend(bytes(grow))
+            self._alive.extend(bytes(grow))
+        codes = self._book_codes(book)
+        self._starts[key] = len(self._features)
+        self._lengths[key] = len(codes)
+        self._features.extend(codes)
+        self._owners.extend([key + 1] * len(codes))
+        self._live_features += len(codes)
+        self._alive[key] = 1
+        self._read[key] = bool(book['read_status'])
+        self._count(codes, self._read[key], 1)
+
+    def removed(self, key, book):
+        self._count(self._codes_of(key), self._read[key], -1)
+        self._alive[key] = 0
+        # The codes stay in _features until the next compaction
+        start, length = self._starts[key], self._lengths[key]
+        self._owners[start:start + length] = array('I', bytes(4 * length))
+        self._live_features -= length
+        self._compact_if_sparse()
+
+    def updated(self, key, old, book):
+        if any(old[field] != book[field] for field in ('title', 'author', 'genre', 'publication_year')):
+            self.removed(key, old)
+            self.added(key, book)
+        elif old['read_status'] != book['read_status']:
+            delta = 1 if book['read_status'] else -1
+            for code in self._codes_of(key):
+                self._read_books[code] += delta
+            self.read += delta
+            self._read[key] = bool(book['read_status'])
+            self._version += 1
+
+    def add_packed(self, authors, author_names, genres, genre_names, years, read):
+        # Loads books 0..n-1 of a read-only archive from its packed columns
+        # (author and genre codes into the name tables, years, read flags)
+        # without decoding any record; title words are left out, as they
+        # would mean decoding every title. Only for an empty recommender.
+        import numpy as np
+
+        n = len(authors)
+        author_codes = np.array([self._code(('author', normalize(name))) for name in author_names], dtype=np.uint32)
+        genre_codes = np.array([self._code(('genre', name)) for name in genre_names], dtype=np.uint32)
+        decades, decade_index = np.unique(years.astype(np.int64) // 10, return_inverse=True)
+        decade_codes = np.array([self._code(('decade', int(decade))) for decade in decades], dtype=np.uint32)
+        features = np.stack([author_codes[authors], genre_codes[genres], decade_codes[decade_index]], axis=1).ravel()
+        read = read.astype(np.uint8)
+        counts = np.bincount(features, minlength=len(self._kinds))
+        read_counts = np.bincount(features, weights=np.repeat(read, 3), minlength=len(self._kinds))
+        self._books = array('q', counts.astype(np.int64).tobytes())
+        self._read_books = array('q', read_counts.astype(np.int64).tobytes())
+        self._features = array('I', features.astype(np.uint32).tobytes())
+        self._owners = array('I', np.repeat(np.arange(1, n + 1, dtype=np.uint32), 3).tobytes())
+        self._starts = array('q', (np.arange(n, dtype=np.int64) * 3).tobytes())
+        self._lengths = array('H', np.full(n, 3, dtype=np.uint16).tobytes())
+        self._read = bytearray(read.tobytes())
+        self._alive = bytearray(b'\x01' * n)
+        self._live_features = 3 * n
+        self.total = n
+        self.read = int(read.sum())
+        self._version += 1
+
+    def recommend(self, limit=10):
+        # Returns up to limit (key, similarity) pairs for unread books, most
+        # similar first; empty until something has been read
+        if self._cache is not None and self._cache[:2] == (self._version, limit):
+            return self._cache[2]
+        results = self._score(limit)
+        self._cache = (self._version, limit, results)
+        return results
+
+    def _score(self, limit):
+        import numpy as np
+
+        if not self.read or limit <= 0:
+            return []
+        n = len(self._codes)
+        books = np.frombuffer(self._books, dtype=np.int64)[:n]
+        read_books = np.frombuffer(self._read_books, dtype=np.int64)[:n]
+        kind_weights = np.array([FEATURE_WEIGHTS[kind] for kind in _KINDS])
+        weights = kind_weights[np.frombuffer(self._kinds, dtype=np.uint8)[:n]] * (np.log((1 + self.total) / (1 + books)) + 1)
+        # profile = sum of the read books' vectors, so a book's dot product
+        # with it sums weight * profile over the book's features
+        profile = weights * read_books
+        profile_norm = math.sqrt(float(profile @ profile))
+        features = np.frombuffer(self._features, dtype=np.uint32)
+        dot = self._book_sums(np.take(weights * profile, features))
+        norm = np.sqrt(self._book_sums(np.take(weights * weights, features)))
+        candidates = np.flatnonzero(np.frombuffer(self._alive, dtype=np.bool_) & ~np.frombuffer(self._read, dtype=np.bool_))
+        candidates = candidates[dot[candidates] > 0]
+        if not len(candidates):
+            return []
+        scores = dot[candidates] / (norm[candidates] * profile_norm)
+        if len(candidates) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            top = np.arange(len(candidates))
+        top = top[np.lexsort((candidates[top], -scores[top]))]
+        return [(int(candidates[i]), float(scores[i])) for i in top]
+
+    def _book_sums(self, values):
+        # Sums values (one per entry of _features) by book, indexed by key
+        import numpy as np
+
+        owners = np.frombuffer(self._owners, dtype=np.uint32)
+        return np.bincount(owners, weights=values, minlength=len(self._starts) + 1)[1:]
+
+    def _book_codes(self, book):
+        features = [('author', normalize(book['author'])), ('genre', book['genre']), ('decade', int(book['publication_year']) // 10)]
+        features += [('title', token) for token in dict.fromkeys(tokenize(book['title']))]
+        known = self._codes
+        codes = [known.get(feature) for feature in features]
+        for i, code in enumerate(codes):
+            if code is None:
+                codes[i] = self._code(features[i])
+        return codes
+
+    def _code(self, feature):
+        code = self._codes.get(feature)
+        if code is None:
+            code = self._codes[feature] = len(self._kinds)
+            self._kinds.append(_KINDS.index(feature[0]))
+            self._books.append(0)
+            self._read_books.append(0)
+        return code
+
+    def _codes_of(self, key):
+        start = self._starts[key]
+        return self._features[start:start + self._lengths[key]]
+
+    def _count(self, codes, read, delta):
+        books, read_books = self._books, self._read_books
+        for code in codes:
+            books[code] += delta
+            if read:
+                read_books[code] += delta
+        self.total += delta
+        self.read += delta if read else 0
+        self._version += 1
+
+    def _compact_if_sparse(self):
+        # Drops the codes of removed and re-added books once they are most
+        # of _features
+        import numpy as np
+
+        if len(self._features) < 2 * self._live_features + 4096:
+            return
+        alive = np.frombuffer(self._alive, dtype=np.bool_)
+        starts = np.frombuffer(self._starts, dtype=np.int64)
+        lengths = np.frombuffer(self._lengths, dtype=np.uint16).astype(np.int64) * alive
+        new_starts = np.cumsum(lengths) - lengths
+        positions = np.arange(int(lengths.sum())) + np.repeat(starts - new_starts, lengths)
+        features = np.frombuffer(self._features, dtype=np.uint32)[positions]
+        owners = np.repeat(np.arange(1, len(lengths) + 1, dtype=np.uint32), lengths)
+        self._features = array('I', features.tobytes())
+        self._owners = array('I', owners.tobytes())
+        self._starts = array('q', new_starts.tobytes())
+        self._lengths = array('H', lengths.astype(np.uint16).tobytes())
@@ -0,0 +1,167 @@
+"""Inverted full-text index over title, author and genre.
+
+Query tokens are matched exactly, the last one also as a prefix (for
+search-as-you-type) once it has ``MIN_PREFIX`` characters, and tokens with no exact or prefix hit fall back to
+typo-tolerant matching through a trigram index over the vocabulary. Results
+are ranked by field weight and match quality.
+"""
+
+import bisect
+import heapq
+import re
+
+FIELDS = {'title': 1, 'author': 2, 'genre': 4}
+FIELD_WEIGHTS = {1: 3.0, 2: 2.0, 4: 1.0}
+EXACT, PREFIX, FUZZY = 1.0, 0.7, 0.4
+# Shorter tokens only match exactly: a single letter is a prefix of a large
+# part of the vocabulary
+MIN_PREFIX = 2
+
+# Weight of the best field in each field bitmask, indexed by the bitmask
+_MASK_WEIGHTS = [max([w for bit, w in FIELD_WEIGHTS.items() if mask & bit], default=0.0) for mask in range(8)]
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(str(text).lower())
+
+
+def trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, limit):
+    # Levenshtein distance counting adjacent transpositions as one edit,
+    # giving up early once every cell of a row exceeds limit
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if before and i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+        if min(current) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return previous[-1]
+
+
+class SearchIndex:
+    def __init__(self, max_expansions=200):
+        self.max_expansions = max_expansions
+        self._postings = {}  # token -> {key: field bitmask}
+        self._vocab = []     # sorted tokens, for prefix lookups
+        self._trigrams = {}  # trigram -> set of tokens, for fuzzy lookups
+
+    # Catalog listener interface
+    def added(self, key, book):
+        for token, mask in self._book_tokens(book).items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                bisect.insort(self._vocab, token)
+                for gram in trigrams(token):
+                    self._trigrams.setdefault(gram, set()).add(token)
+            postings[key] = mask
+
+    def removed(self, key, book):
+        for token in self._book_tokens(book):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(key, None)
+            if not postings:
+                del self._postings[token]
+                del self._vocab[bisect.bisect_left(self._vocab, token)]
+                for gram in trigrams(token):
+                    tokens = self._trigrams[gram]
+                    tokens.discard(token)
+                    if not tokens:
+                        del self._trigrams[gram]
+
+    def updated(self, key, old, book):
+        if any(old[field] != book[field] for field in FIELDS):
+            self.removed(key, old)
+            self.added(key, book)
+
+    def search(self, query, field=None, limit=None):
+        # Returns keys ordered by descending score. Every query token has to
+        # match (exactly, by prefix or fuzzily) for a book to be returned.
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        field_mask = FIELDS[field] if field else sum(FIELDS.values())
+        matches = [self._match(token, prefix=i == len(tokens) - 1) for i, token in enumerate(tokens)]
+        if not all(matches):
+            return []
+        # Score the rarest token first so later tokens only probe the
+        # surviving candidates instead of walking their whole postings.
+        matches.sort(key=lambda terms: sum(len(postings) for postings, _ in terms))
+        scores = {}
+        for postings, quality in matches[0]:
+            for key, mask in postings.items():
+                score = quality * _MASK_WEIGHTS[mask & field_mask]
+                if score > scores.get(key, 0):
+                    scores[key] = score
+        scores = {key: score for key, score in scores.items() if score}
+        for terms in matches[1:]:
+            narrowed = {}
+            for key, total in scores.items():
+                best = 0.0
+                for postings, quality in terms:
+                    mask = postings.get(key)
+                    if mask:
+                        best = max(best, quality * _MASK_WEIGHTS[mask & field_mask])
+                if best:
+                    narrowed[key] = total + best
+            scores = narrowed
+        if limit:
+            return heapq.nlargest(limit, scores, key=scores.__getitem__)
+        return sorted(scores, key=scores.__getitem__, reverse=True)
+
+    def _match(self, token, prefix):
+        # Returns (postings, quality) pairs for every vocabulary token that
+        # matches the query token.
+        terms = []
+        if token in self._postings:
+            terms.append((self._postings[token], EXACT))
+        if prefix and len(token) >= MIN_PREFIX:
+            start = bisect.bisect_left(self._vocab, token)
+            for candidate in self._vocab[start:start + self.max_expansions + 1]:
+                if not candidate.startswith(token):
+                    break
+                if candidate != token:
+                    terms.append((self._postings[candidate], PREFIX))
+        if not terms and len(token) >= 3:
+            for candidate, distance in self._fuzzy_candidates(token):
+                terms.append((self._postings[candidate], FUZZY / distance))
+        return terms
+
+    def _fuzzy_candidates(self, token):
+        limit = 1 if len(token) < 6 else 2
+        grams = trigrams(token)
+        shared = {}
+        for gram in grams:
+            for candidate in self._trigrams.get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        # A candidate within the edit limit must share a minimum number of
+        # trigrams with the query, which prunes most of the vocabulary.
+        threshold = max(1, len(grams) - 3 * limit)
+        for candidate, count in shared.items():
+            if count >= threshold:
+                distance = edit_distance(token, candidate, limit)
+                if distance <= limit:
+                    yield candidate, distance
+
+    def _book_tokens(self, book):
+        tokens = {}
+        for field, bit in FIELDS.items():
+            for token in tokenize(book[field]):
+                tokens[token] = tokens.get(token, 0) | bit
+        return tokens
@@ -0,0 +1,431 @@
+"""SQLite storage backend, an alternative to the JSON journal.
+
+Exposes the same load/append/save interface as JournalStore, plus queries
+that push read-status filtering and text search down into SQL. Title and
+author comparisons use COLLATE NOCASE, which folds ASCII letters only.
+
+Libraries don't load the table: ``open_catalog()`` returns a ``SqlCatalog``
+that answers lookups with indexed queries, and counts and statistics come
+from the ``book_counts`` table that triggers keep up to date.
+
+SQLite does its own cross-process locking. ``locked()`` opens an immediate
+(write-locked) transaction and reports through ``PRAGMA data_version`` whether
+another connection committed since this one last looked; it can't say what
+changed, so callers reload (which costs nothing, as nothing is cached).
+Books have no per-record versions here; their ids are the table's INTEGER
+PRIMARY KEY.
+"""
+
+import contextlib
+import sqlite3
+import sys
+import threading
+
+from library_core.metrics import timed
+from library_core.storage import JournalStore
+
+COLUMNS = ('title', 'author', 'publication_year', 'genre', 'read_status')
+# Fields book_counts keeps per-value book counts of, and their names in
+# summary()
+COUNTED = {'genre': 'genres', 'publication_year': 'years', 'author': 'authors', 'read_status': None}
+
+
+def _count_rows(row, delta):
+    # Trigger statements adding delta to the counts of a NEW or OLD row
+    return ''.join(f"""
+    INSERT INTO book_counts VALUES ('{field}', {row}.{field}, {delta})
+        ON CONFLICT (field, value) DO UPDATE SET books = books + {delta};""" for field in COUNTED)
+
+
+# Statistics: books per genre, year, author and read status, kept up to date
+# by these triggers so counts and summaries never scan the books. Values
+# whose last book went away stay behind with a count of 0.
+TRIGGERS = (
+    f"CREATE TRIGGER IF NOT EXISTS books_insert_counts AFTER INSERT ON books BEGIN{_count_rows('NEW', 1)}\nEND",
+    f"CREATE TRIGGER IF NOT EXISTS books_delete_counts AFTER DELETE ON books BEGIN{_count_rows('OLD', -1)}\nEND",
+    f"""CREATE TRIGGER IF NOT EXISTS books_update_counts AFTER UPDATE OF {', '.join(COUNTED)} ON books
+    BEGIN{_count_rows('OLD', -1)}{_count_rows('NEW', 1)}\nEND""",
+)
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS books (
+        id INTEGER PRIMARY KEY,
+        title TEXT NOT NULL,
+        author TEXT NOT NULL,
+        publication_year INTEGER,
+        genre TEXT,
+        read_status INTEGER NOT NULL DEFAULT 0
+    )""",
+    'CREATE INDEX IF NOT EXISTS idx_books_title ON books(title COLLATE NOCASE)',
+    'CREATE INDEX IF NOT EXISTS idx_books_author ON books(author COLLATE NOCASE)',
+    'CREATE INDEX IF NOT EXISTS idx_books_genre ON books(genre)',
+    'CREATE INDEX IF NOT EXISTS idx_books_year ON books(publication_year)',
+    'CREATE INDEX IF NOT EXISTS idx_books_read_status ON books(read_status)',
+    """CREATE TABLE IF NOT EXISTS book_counts (
+        field TEXT NOT NULL,
+        value,
+        books INTEGER NOT NULL,
+        PRIMARY KEY (field, value)
+    )""",
+) + TRIGGERS
+# Rows fetched at a time when iterating over every book
+_CHUNK = 10000
+SEARCH_FIELDS = ('title', 'author', 'genre')
+# The id column is the book id; rows from before ids keep their rowids
+_ROW = ('id',) + COLUMNS
+
+
+def _row_to_book(row):
+    book = dict(zip(_ROW, row))
+    book['read_status'] = bool(book['read_status'])
+    return book
+
+
+def _escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class SqliteStore:
+    def __init__(self, path='library.db'):
+        self.path = path
+        # Streamlit reruns the script on different threads, so the connection
+        # is shared and serialized with a lock.
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.RLock()
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            # In WAL mode this syncs at checkpoints rather than on every
+            # commit, so each change can commit on its own
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            with self._conn:
+                self._conn.execute('BEGIN IMMEDIATE')
+                counted = self._conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'book_counts'").fetchone()
+                for statement in SCHEMA:
+                    self._conn.execute(statement)
+                if not counted:
+                    # A database from before the counts: fill them in once
+                    self._recount()
+        self._data_version = self._read_data_version()
+
+    def close(self):
+        self._conn.close()
+
+    def open_catalog(self):
+        return SqlCatalog(self)
+
+    @timed('storage.load')
+    def load(self):
+        return self.books()
+
+    @contextlib.contextmanager
+    def locked(self):
+        # Holds the database write lock; yields [] if nobody else committed
+        # since the last check and None otherwise
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield self._poll()
+            except BaseException:
+                if self._conn.in_transaction:
+                    self._conn.rollback()
+                raise
+            if self._conn.in_transaction:
+                self._conn.commit()
+
+    def changes(self):
+        with self._lock:
+            return self._poll()
+
+    def append(self, op):
+        return self.append_many([op])
+
+    @timed('storage.append')
+    def append_many(self, ops):
+        # Applies a batch of journal-style operations in one transaction.
+        # There are no sequence numbers, so this returns None.
+        with self._transaction():
+            # Runs of adds (a bulk import) go in one executemany
+            books = []
+            for op in ops:
+                if op['op'] == 'add':
+                    books.append(op['book'])
+                    continue
+                self._insert_many(books)
+                books = []
+                self._apply(op)
+            self._insert_many(books)
+        return None
+
+    @timed('storage.save')
+    def save(self, library):
+        with self._transaction():
+            # Rewriting every row counts once at the end instead of per row
+            for name in ('books_insert_counts', 'books_delete_counts', 'books_update_counts'):
+                self._conn.execute(f'DROP TRIGGER {name}')
+            self._conn.execute('DELETE FROM books')
+            self._insert_many(library)
+            self._recount()
+            for statement in TRIGGERS:
+                self._conn.execute(statement)
+
+    def compact(self, wait=False):
+        # Writes already land in the database file; nothing to fold
+        pass
+
+    @timed('storage.query')
+    def count(self, read_status=None):
+        # From book_counts, so this doesn't scan the books
+        sql = "SELECT COALESCE(SUM(books), 0) FROM book_counts WHERE field = 'read_status'"
+        params = ()
+        if read_status is not None:
+            sql += ' AND value = ?'
+            params = (int(read_status),)
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()[0]
+
+    @timed('storage.query')
+    def summary(self):
+        # Same shape as LibraryStats.summary(), from book_counts
+        counts = {field: {} for field in COUNTED}
+        with self._lock:
+            for field, value, books in self._conn.execute('SELECT field, value, books FROM book_counts WHERE books > 0'):
+                if field in counts:
+                    counts[field][value] = books
+        read = counts['read_status'].get(1, 0)
+        total = read + counts['read_status'].get(0, 0)
+        summary = {'total': total, 'read': read, 'percent_read': read / total * 100 if total else 0}
+        summary.update((name, counts[field]) for field, name in COUNTED.items() if name)
+        return summary
+
+    @timed('storage.query')
+    def books(self, read_status=None, order_by='id', descending=False, limit=None, offset=0):
+        if order_by not in COLUMNS + ('id',):
+            raise ValueError(f"Cannot order by {order_by!r}")
+        where, params = self._where(read_status)
+        collate = ' COLLATE NOCASE' if order_by in SEARCH_FIELDS else ''
+        sql = f"SELECT {', '.join(_ROW)} FROM books{where} ORDER BY {order_by}{collate} {'DESC' if descending else 'ASC'}"
+        if limit is not None:
+            sql += ' LIMIT ? OFFSET ?'
+            params += (limit, offset)
+        with self._lock:
+            return [_row_to_book(row) for row in self._conn.execute(sql, params)]
+
+    @timed('storage.search')
+    def search(self, query, field=None, limit=None):
+        # Case-insensitive substring match on one field, or on all of them
+        fields = (field,) if field else SEARCH_FIELDS
+        if any(f not in SEARCH_FIELDS for f in fields):
+            raise ValueError(f"Cannot search by {field!r}")
+        pattern = f"%{_escape_like(query)}%"
+        where = ' OR '.join(f"{f} LIKE ? ESCAPE '\\'" for f in fields)
+        sql = f"SELECT {', '.join(_ROW)} FROM books WHERE {where} ORDER BY id"
+        params = (pattern,) * len(fields)
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params += (limit,)
+        with self._lock:
+            return [_row_to_book(row) for row in self._conn.execute(sql, params)]
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        # Inside locked() the writes join its transaction (as a savepoint, so
+        # a failed batch is undone on its own) and are committed with it;
+        # committing here would drop the write lock locked() holds
+        with self._lock:
+            if not self._conn.in_transaction:
+                with self._conn:
+                    yield
+                return
+            self._conn.execute('SAVEPOINT batch')
+            try:
+                yield
+            except BaseException:
+                self._conn.execute('ROLLBACK TO batch')
+                raise
+            finally:
+                self._conn.execute('RELEASE batch')
+
+    def _recount(self):
+        self._conn.execute('DELETE FROM book_counts')
+        for field in COUNTED:
+            self._conn.execute(f"INSERT INTO book_counts SELECT '{field}', {field}, COUNT(*) FROM books GROUP BY {field}")
+
+    @timed('storage.poll')
+    def _poll(self):
+        # data_version only moves when another connection commits
+        data_version = self._read_data_version()
+        changed = data_version != self._data_version
+        self._data_version = data_version
+        return None if changed else []
+
+    def _read_data_version(self):
+        return self._conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def _where(self, read_status):
+        if read_status is None:
+            return '', ()
+        return ' WHERE read_status = ?', (int(read_status),)
+
+    def _insert_many(self, books):
+        # Books without an id get the next rowid
+        self._conn.executemany(
+            f"INSERT INTO books ({', '.join(_ROW)}) VALUES ({', '.join('?' * len(_ROW))})",
+            ((b.get('id'), b['title'], b['author'], b['publication_year'], b['genre'], int(b['read_status'])) for b in books))
+
+    def _apply(self, op):
+        # Same semantics as storage.apply_op on the JSON library
+        if op['op'] == 'add':
+            self._insert_many([op['book']])
+        elif op['op'] == 'update':
+            fields = list(op['fields'])
+            if not set(fields) <= set(COLUMNS):
+                raise ValueError(f"Unknown book fields: {', '.join(fields)}")
+            assignments = ', '.join(f'{field} = ?' for field in fields)
+            values = [int(value) if isinstance(value, bool) else value for value in op['fields'].values()]
+            self._conn.executemany(f'UPDATE books SET {assignments} WHERE id = ?', ([*values, book_id] for book_id in op['ids']))
+        elif op['op'] == 'remove':
+            self._conn.executemany('DELETE FROM books WHERE id = ?', ((book_id,) for book_id in op['ids']))
+        else:
+            raise ValueError(f"Unknown journal operation: {op['op']!r}")
+
+
+class SqlCatalog:
+    # Same interface as catalog.Catalog (less listeners), answered with
+    # indexed queries on the store's database instead of from a copy in
+    # memory; keys are book ids. Library writes each change to the database
+    # before it tells the catalog, so the change methods only bump version.
+    def __init__(self, store):
+        self._store = store
+        self._packed = None
+        self.version = 0
+
+    def __len__(self):
+        return self._store.count()
+
+    def __iter__(self):
+        # In id order, a chunk of rows at a time
+        last = -1 << 63
+        while True:
+            rows = self._query(f"SELECT {', '.join(_ROW)} FROM books WHERE id > ? ORDER BY id LIMIT ?", (last, _CHUNK))
+            yield from map(_catalog_book, rows)
+            if len(rows) < _CHUNK:
+                return
+            last = rows[-1][0]
+
+    def books(self):
+        return list(self)
+
+    def keys(self):
+        return [book_id for book_id, in self._query('SELECT id FROM books ORDER BY id')]
+
+    def get(self, key):
+        rows = self._query(f"SELECT {', '.join(_ROW)} FROM books WHERE id = ?", (key,))
+        return _catalog_book(rows[0]) if rows else None
+
+    def key_for_id(self, book_id):
+        return book_id if self._query('SELECT 1 FROM books WHERE id = ?', (book_id,)) else None
+
+    def id_of(self, key):
+        return key
+
+    def keys_for_title(self, title):
+        return [key for key, in self._query('SELECT id FROM books WHERE title = ? COLLATE NOCASE ORDER BY id', (title,))]
+
+    def keys_for_book(self, title, author):
+        sql = 'SELECT id FROM books WHERE title = ? COLLATE NOCASE AND author = ? COLLATE NOCASE ORDER BY id'
+        return [key for key, in self._query(sql, (title, author))]
+
+    def contains(self, title, author):
+        sql = 'SELECT 1 FROM books WHERE title = ? COLLATE NOCASE AND author = ? COLLATE NOCASE LIMIT 1'
+        return bool(self._query(sql, (title, author)))
+
+    def select(self, read_status=None, genres=None, authors=None, min_year=None, max_year=None):
+        conditions, params = [], []
+        if read_status is not None:
+            conditions.append('read_status = ?')
+            params.append(int(read_status))
+        if genres is not None:
+            conditions.append(f"genre IN ({', '.join('?' * len(genres))})")
+            params.extend(genres)
+        if authors is not None:
+            conditions.append(f"author COLLATE NOCASE IN ({', '.join('?' * len(authors))})")
+            params.extend(authors)
+        if min_year is not None:
+            conditions.append('publication_year >= ?')
+            params.append(min_year)
+        if max_year is not None:
+            conditions.append('publication_year <= ?')
+            params.append(max_year)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+        return [key for key, in self._query(f'SELECT id FROM books{where} ORDER BY id', params)]
+
+    def summary(self):
+        return self._store.summary()
+
+    def add(self, book):
+        self.version += 1
+        return book['id']
+
+    def update(self, key, **fields):
+        self.version += 1
+        return self.get(key)
+
+    def remove(self, key):
+        self.version += 1
+
+    def column(self, field):
+        # Columns as NumPy arrays in id order, as MappedCatalog has them;
+        # authors and genres are codes into strings(field). They come from
+        # one scan of the table, repeated only after a change.
+        return self._columns()[field]
+
+    def strings(self, field):
+        return self._columns()[f'{field}_table']
+
+    def _columns(self):
+        import numpy as np
+
+        if self._packed is not None and self._packed[0] == self.version:
+            return self._packed[1]
+        ids, authors, genres, years, read = [], [], [], [], []
+        author_codes, genre_codes = {}, {}
+        for book_id, author, genre, year, read_status in self._query(
+                'SELECT id, author, genre, publication_year, read_status FROM books ORDER BY id'):
+            ids.append(book_id)
+            authors.append(author_codes.setdefault(author, len(author_codes)))
+            genres.append(genre_codes.setdefault(genre, len(genre_codes)))
+            years.append(year)
+            read.append(read_status)
+        columns = {'id': np.array(ids, dtype=np.int64), 'author': np.array(authors, dtype=np.uint32),
+                   'genre': np.array(genres, dtype=np.uint32), 'publication_year': np.array(years, dtype=np.int64),
+                   'read_status': np.array(read, dtype=np.bool_),
+                   'author_table': list(author_codes), 'genre_table': list(genre_codes)}
+        self._packed = (self.version, columns)
+        return columns
+
+    def _query(self, sql, params=()):
+        store = self._store
+        with store._lock:
+            return store._conn.execute(sql, params).fetchall()
+
+
+def _catalog_book(row):
+    # SQLite keeps no per-book versions
+    return dict(_row_to_book(row), version=0)
+
+
+def migrate_json(json_path='library.json', db_path='library.db'):
+    # One-shot import of a JSON library (snapshot plus journal) into SQLite
+    library = JournalStore(json_path).load()
+    store = SqliteStore(db_path)
+    try:
+        store.save(library)
+    finally:
+        store.close()
+    return len(library)
+
+
+if __name__ == '__main__':
+    source = sys.argv[1] if len(sys.argv) > 1 else 'library.json'
+    target = sys.argv[2] if len(sys.argv) > 2 else 'library.db'
+    print(f"Migrated {migrate_json(source, target)} books from {source} to {target}")
@@ -0,0 +1,58 @@
+"""Library statistics maintained incrementally from catalog changes."""
+
+
+def _bump(counts, key, delta):
+    count = counts.get(key, 0) + delta
+    if count:
+        counts[key] = count
+    else:
+        del counts[key]
+
+
+class LibraryStats:
+    # Catalog listener keeping counters up to date in O(1) per change, so
+    # pages read the aggregates instead of walking the library.
+    def __init__(self):
+        self.total = 0
+        self.read = 0
+        self.genres = {}
+        self.years = {}
+        self.authors = {}
+
+    def added(self, key, book):
+        self._count(book, 1)
+
+    def removed(self, key, book):
+        self._count(book, -1)
+
+    def updated(self, key, old, book):
+        self._count(old, -1)
+        self._count(book, 1)
+
+    def summary(self):
+        percent_read = (self.read / self.total * 100) if self.total > 0 else 0
+        # Copies, so callers can iterate them while the library keeps changing
+        return {"total": self.total, "read": self.read, "percent_read": percent_read,
+                "genres": dict(self.genres), "years": dict(self.years), "authors": dict(self.authors)}
+
+    def _count(self, book, delta):
+        self.total += delta
+        if book['read_status']:
+            self.read += delta
+        _bump(self.genres, book['genre'], delta)
+        _bump(self.years, book['publication_year'], delta)
+        _bump(self.authors, book['author'], delta)
+
+
+def bin_years(years, max_points=150):
+    # Groups {year: count} into the finest of yearly, per-decade or
+    # per-century bins that gives at most max_points points. Returns the bin
+    # width and a sorted list of (first year of the bin, count).
+    for width in (1, 10, 100):
+        if len({year // width for year in years}) <= max_points:
+            break
+    bins = {}
+    for year, count in years.items():
+        start = year // width * width
+        bins[start] = bins.get(start, 0) + count
+    return width, sorted(bins.items())
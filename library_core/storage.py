@@ -0,0 +1,496 @@
+"""Append-only journal storage for the library.
+
+Every mutation is appended as one JSON line to ``<path>.journal``. Once the
+journal grows past ``compact_every`` entries it is sealed (renamed) and a
+background thread folds it into the snapshot at ``<path>``. Loading replays
+the snapshot followed by any sealed journals and the active journal.
+
+Each journal entry carries a sequence number and the snapshot records the
+last sequence number it contains, so replaying a journal that was already
+folded into the snapshot (e.g. after a crash mid-compaction) is a no-op.
+Snapshots are JSON, or the column-packed binary format from ``codec`` with
+``snapshot_format='binary'``; loading accepts either.
+
+Several processes (or Streamlit sessions, each with its own store) can share
+one library. Writers hold an exclusive ``fcntl`` lock on ``<path>.lock``,
+readers a shared one. Before writing, a store reads the entries other stores
+appended since it last looked and hands them to its caller through
+``locked()``, so in-memory copies catch up incrementally instead of being
+reloaded. Sequence numbers double as per-record versions: every book keeps
+the sequence number of the last entry that changed it.
+
+Every journal file starts with a header line naming its generation, a random
+token, so a store reading incrementally never mistakes a new journal for the
+one it was reading (file systems reuse the inodes of deleted files).
+
+Entries name the books they change by ``id`` (see ``ids``) and are replayed
+onto an id -> book map, so each costs the same however large the library is.
+A ``library.json`` from before the journal (a plain list of books without
+ids) is numbered and rewritten the first time it is loaded.
+"""
+
+import contextlib
+import glob
+import os
+import re
+import stat
+import tempfile
+import threading
+import uuid
+
+from library_core import codec
+from library_core.metrics import timed
+
+try:
+    import fcntl
+except ImportError:
+    # No cross-process locking on platforms without fcntl (Windows)
+    fcntl = None
+
+_SNAPSHOT_SEQ_RE = re.compile(rb'^\{"seq":\s*(\d+)')
+_HEADER_RE = re.compile(rb'^\{"journal":"([0-9a-f]+)"\}\n')
+_TAIL_CHUNK = 65536
+# The umask can only be read by setting it, so this is done once at import
+# rather than while other threads may be creating files
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+
+
+class ConflictError(ValueError):
+    # Raised when a book changed on disk since the caller last saw it
+    pass
+
+
+def _write_temp(path, data):
+    # Writes text or bytes to an fsynced temp file next to path and returns
+    # its name
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data.encode('utf-8') if isinstance(data, str) else data)
+            file.flush()
+            os.fsync(file.fileno())
+        # mkstemp creates the file private (0600); give it the permissions
+        # of the file it replaces, or those open() would have given it
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(tmp_path, mode)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path
+
+
+def atomic_write(path, data):
+    # Write to a temp file in the same directory, fsync it and rename it over
+    # the target so readers only ever see the old or the new file.
+    tmp_path = _write_temp(path, data)
+    try:
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    _fsync_dir(os.path.dirname(os.path.abspath(path)))
+
+
+def _fsync_dir(directory):
+    # Persist the rename itself; not supported on every platform.
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def index_records(books):
+    # The id -> book map of a snapshot's books, in order. Books from a
+    # pre-journal library.json have no ids and are numbered after the last one.
+    records = {}
+    for book in books:
+        if 'id' not in book:
+            book = {'id': next(reversed(records), 0) + 1, **book}
+        records[book['id']] = book
+    return records
+
+
+def apply_op(records, entry):
+    # Replays one journal entry onto an id -> book map, mirroring the
+    # semantics of the corresponding Library methods.
+    op = entry['op']
+    if op == 'add':
+        # Ids are checked under the write lock before they are journaled;
+        # should two adds still share one (a journal written before that),
+        # the first one wins everywhere it is replayed
+        book = dict(entry['book'], version=entry['seq'])
+        records.setdefault(book['id'], book)
+    elif op == 'update':
+        for book_id in entry['ids']:
+            book = records.get(book_id)
+            if book is not None:
+                book.update(entry['fields'], version=entry['seq'])
+    elif op == 'remove':
+        for book_id in entry['ids']:
+            records.pop(book_id, None)
+    else:
+        raise ValueError(f"Unknown journal operation: {op!r}")
+
+
+def _parse_entries(data):
+    # The entries in complete journal lines, without the generation header
+    entries = [codec.loads(line) for line in data.split(b'\n') if line]
+    return [entry for entry in entries if 'journal' not in entry]
+
+
+def _generation(file):
+    # The generation in a journal's header, or None without one
+    file.seek(0)
+    match = _HEADER_RE.match(file.read(64))
+    return match.group(1).decode() if match else None
+
+
+def _last_line_end(file, size):
+    # Position just past the last newline before size, or 0 if there is none
+    end = size
+    while end > 0:
+        start = max(0, end - _TAIL_CHUNK)
+        file.seek(start)
+        newline = file.read(end - start).rfind(b'\n')
+        if newline >= 0:
+            return start + newline + 1
+        end = start
+    return 0
+
+
+class FileLock:
+    # Reentrant lock on a side file: flock across processes, an RLock across
+    # threads. A nested hold keeps the outer lock's mode.
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._file = None
+        self._depth = 0
+
+    @contextlib.contextmanager
+    def hold(self, exclusive=True, blocking=True):
+        if not self._thread_lock.acquire(blocking):
+            yield False
+            return
+        try:
+            if self._depth == 0:
+                self._file = open(self.path, 'a+b')
+                if fcntl is not None:
+                    flags = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+                    try:
+                        fcntl.flock(self._file.fileno(), flags if blocking else flags | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        self._file.close()
+                        self._file = None
+                        yield False
+                        return
+            self._depth += 1
+            try:
+                yield True
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    # Closing the file releases the flock
+                    self._file.close()
+                    self._file = None
+        finally:
+            self._thread_lock.release()
+
+
+class JournalStore:
+    def __init__(self, path='library.json', compact_every=500, snapshot_format='json'):
+        self.path = path
+        self.journal_path = path + '.journal'
+        self.compact_every = compact_every
+        # Format of the snapshots this store writes; either is read
+        self.snapshot_format = snapshot_format
+        self.seq = 0
+        self.pending = 0
+        self._lock = FileLock(path + '.lock')
+        self._compact_lock = FileLock(path + '.compact.lock')
+        self._compactor = None
+        # Generation of the active journal and the position in it up to which
+        # entries have been read
+        self._journal_id = None
+        self._offset = 0
+
+    @timed('storage.load')
+    def load(self):
+        with self._lock.hold(exclusive=False):
+            records, legacy = self._replay()
+            sealed = bool(self._sealed_journals())
+        if legacy:
+            # A pre-journal library.json: number its books once and write
+            # them out, so every store sees the same ids from now on
+            with self._lock.hold():
+                records, legacy = self._replay()
+                if legacy:
+                    self._replace(list(records.values()))
+                    sealed = False
+        if sealed:
+            self._start_compactor()
+        return list(records.values())
+
+    @contextlib.contextmanager
+    def locked(self):
+        # Holds the exclusive write lock and yields the entries other stores
+        # committed since this one last looked, or None when they can't be
+        # replayed incrementally and the caller has to load() again.
+        with self._lock.hold():
+            yield self._poll()
+
+    def changes(self):
+        # Same as locked() but under a shared lock, for readers
+        with self._lock.hold(exclusive=False):
+            return self._poll()
+
+    def append(self, op):
+        return self.append_many([op])
+
+    @timed('storage.append')
+    def append_many(self, ops):
+        # Appends a batch of operations with a single write and fsync and
+        # returns the sequence number of the last one. Callers holding an
+        # in-memory copy must call this inside locked() and apply the entries
+        # it yields first; entries this store hasn't seen raise ConflictError
+        # rather than being skipped.
+        sealed = False
+        with self._lock.hold():
+            if not self._caught_up():
+                raise ConflictError("The library changed on disk since it was read; refresh and try again.")
+            lines = []
+            for op in ops:
+                self.seq += 1
+                lines.append(codec.dumps(dict(op, seq=self.seq)) + b'\n')
+            with open(self.journal_path, 'ab') as file:
+                self._repair_tail(file)
+                if not file.seek(0, os.SEEK_END):
+                    self._journal_id = uuid.uuid4().hex
+                    lines.insert(0, b'{"journal":"%s"}\n' % self._journal_id.encode())
+                file.write(b''.join(lines))
+                file.flush()
+                os.fsync(file.fileno())
+                self._offset = file.tell()
+            self.pending += len(ops)
+            if self.pending >= self.compact_every:
+                self._seal_journal()
+                sealed = True
+        if sealed:
+            self._start_compactor()
+        return self.seq
+
+    @timed('storage.save')
+    def save(self, library):
+        # Writes a full snapshot and drops every journal it supersedes
+        with self._lock.hold():
+            changes = self._poll()
+            if changes is None or changes:
+                raise ConflictError("The library was changed by another session; reload it before saving.")
+            self._replace(library)
+
+    def compact(self, wait=False):
+        with self._lock.hold():
+            # Only seals a journal this store has read to the end
+            if self.pending and self._caught_up():
+                self._seal_journal()
+        self._start_compactor()
+        if wait and self._compactor is not None:
+            self._compactor.join()
+
+    def close(self):
+        # Lets a running compaction finish before the process exits
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+
+    def _replay(self):
+        # Reads the snapshot and replays the journals onto it; also says
+        # whether the snapshot's books still need ids
+        books, self.seq = self._read_snapshot()
+        legacy = any('id' not in book for book in books)
+        records = index_records(books)
+        entries = [entry for path in self._sealed_journals() for entry in self._read_entries(path)]
+        self._journal_id, self._offset, self.pending = None, 0, 0
+        entries += self._read_active_journal()
+        for entry in entries:
+            if entry['seq'] > self.seq:
+                apply_op(records, entry)
+                self.seq = entry['seq']
+        return records, legacy
+
+    def _replace(self, library):
+        # Writes a full snapshot and drops every journal it supersedes; call
+        # with the write lock held
+        self._write_snapshot(library, self.seq)
+        for path in self._sealed_journals():
+            os.remove(path)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self._journal_id, self._offset, self.pending = None, 0, 0
+
+    @timed('storage.poll')
+    def _poll(self):
+        # Reads entries newer than self.seq from the sealed and active
+        # journals. They must continue our sequence without gaps; a gap means
+        # entries were folded into a newer snapshot we haven't read.
+        entries = []
+        for path in self._sealed_journals():
+            entries.extend(entry for entry in self._read_entries(path) if entry['seq'] > self.seq)
+        active = self._read_active_journal(incremental=True)
+        if active is None:
+            return None
+        entries.extend(entry for entry in active if entry['seq'] > self.seq)
+        entries.sort(key=lambda entry: entry['seq'])
+        expected = self.seq + 1
+        for entry in entries:
+            if entry['seq'] != expected:
+                return None
+            expected += 1
+        if self._peek_snapshot_seq() > expected - 1:
+            return None
+        self.seq = expected - 1
+        return entries
+
+    def _caught_up(self):
+        # Whether no other store committed since this one last looked. If one
+        # did, the read position is put back, so the caller's next changes()
+        # or locked() still returns those entries.
+        position = self.seq, self._journal_id, self._offset, self.pending
+        if self._poll() == []:
+            return True
+        self.seq, self._journal_id, self._offset, self.pending = position
+        return False
+
+    def _seal_journal(self):
+        os.replace(self.journal_path, f"{self.journal_path}.{self.seq}")
+        self._journal_id, self._offset, self.pending = None, 0, 0
+
+    def _sealed_journals(self):
+        paths = glob.glob(glob.escape(self.journal_path) + '.*')
+        paths = [p for p in paths if p.rsplit('.', 1)[1].isdigit()]
+        return sorted(paths, key=lambda p: int(p.rsplit('.', 1)[1]))
+
+    def _start_compactor(self):
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        self._compactor = threading.Thread(target=self._compact_sealed, daemon=True)
+        self._compactor.start()
+
+    @timed('storage.compact')
+    def _compact_sealed(self):
+        # Only one store compacts at a time; the others skip
+        with self._compact_lock.hold(blocking=False) as acquired:
+            if not acquired:
+                return
+            sealed = self._sealed_journals()
+            if not sealed:
+                return
+            # Writers only append to the active journal, so the snapshot and
+            # the sealed journals can be folded without the write lock
+            books, seq = self._read_snapshot()
+            records = index_records(books)
+            for path in sealed:
+                for entry in self._read_entries(path):
+                    if entry['seq'] > seq:
+                        apply_op(records, entry)
+                        seq = entry['seq']
+            tmp_path = _write_temp(self.path, codec.dumps_snapshot(list(records.values()), seq, self.snapshot_format))
+            with self._lock.hold():
+                if self._peek_snapshot_seq() > seq:
+                    # A full save() overtook us and already dropped the journals
+                    os.remove(tmp_path)
+                    return
+                os.replace(tmp_path, self.path)
+                _fsync_dir(os.path.dirname(os.path.abspath(self.path)))
+                for path in sealed:
+                    if os.path.exists(path):
+                        os.remove(path)
+
+    def _read_snapshot(self):
+        if not os.path.exists(self.path):
+            return [], 0
+        with open(self.path, 'rb') as file:
+            return codec.loads_snapshot(file.read())
+
+    def _peek_snapshot_seq(self):
+        # Snapshots start with their sequence number, so this reads a few bytes
+        try:
+            with open(self.path, 'rb') as file:
+                head = file.read(64)
+        except FileNotFoundError:
+            return 0
+        if codec.is_binary(head):
+            return codec.peek_seq(head)
+        match = _SNAPSHOT_SEQ_RE.match(head)
+        return int(match.group(1)) if match else 0
+
+    def _write_snapshot(self, library, seq):
+        atomic_write(self.path, codec.dumps_snapshot(library, seq, self.snapshot_format))
+
+    def _read_entries(self, path):
+        # Parses the complete lines of a journal
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            return []
+        return _parse_entries(data[:data.rfind(b'\n') + 1])
+
+    def _read_active_journal(self, incremental=False):
+        # Reads the active journal, continuing from the last offset when it is
+        # still the same generation; a crash mid-append can leave a partial
+        # last line, which is ignored here and cut off by the next append.
+        # Incremental reads return None when what follows the offset doesn't
+        # parse, so the caller reloads.
+        try:
+            with open(self.journal_path, 'rb') as file:
+                generation = _generation(file)
+                size = file.seek(0, os.SEEK_END)
+                if incremental and generation is not None and generation == self._journal_id and size >= self._offset:
+                    start = self._offset
+                else:
+                    start, self.pending = 0, 0
+                file.seek(start)
+                data = file.read()
+        except FileNotFoundError:
+            self._journal_id, self._offset, self.pending = None, 0, 0
+            return []
+        end = data.rfind(b'\n') + 1
+        try:
+            entries = _parse_entries(data[:end])
+        except ValueError:
+            if not start:
+                raise
+            self._journal_id, self._offset, self.pending = None, 0, 0
+            return None
+        self._journal_id, self._offset = generation, start + end
+        self.pending += len(entries)
+        return entries
+
+    def _repair_tail(self, file):
+        # Cuts a partial last line left by a crash so the next entry starts
+        # on a fresh line: back to where this store last read up to when it
+        # is the same journal, else to the last newline (or nothing)
+        size = file.seek(0, os.SEEK_END)
+        if not size:
+            return
+        with open(self.journal_path, 'rb') as reader:
+            reader.seek(size - 1)
+            if reader.read(1) == b'\n':
+                return
+            if self._journal_id is not None and _generation(reader) == self._journal_id and self._offset <= size:
+                end = self._offset
+            else:
+                end = _last_line_end(reader, size)
+        file.truncate(end)
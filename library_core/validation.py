@@ -0,0 +1,77 @@
+"""Validation rules for books, shared by the Add Book form, bulk import and bulk edits."""
+
+from collections.abc import Mapping
+from datetime import datetime
+
+from library_core.history import PERIODS
+
+GENRES = ["Fiction", "Non-fiction", "Mystery", "Science Fiction", "Fantasy", "Biography", "History", "Self-help", "Romance", "Thriller", "Other"]
+MIN_YEAR = 1000
+TRUE_VALUES = {'true', '1', 'yes', 'y', 'read'}
+FALSE_VALUES = {'false', '0', 'no', 'n', 'unread', ''}
+
+
+def parse_book(row):
+    # Turns a raw row (form values, CSV strings, JSON or Parquet values) into
+    # a book dict, raising ValueError when it breaks one of the rules.
+    if not isinstance(row, Mapping):
+        raise ValueError(f"Expected an object with the book's fields, got {type(row).__name__}")
+    title = str(row.get('title') or '').strip()
+    author = str(row.get('author') or '').strip()
+    if not title or not author:
+        raise ValueError("Title and author are required fields!")
+    year = _parse_year(row.get('publication_year'))
+    genre = _parse_genre(row.get('genre'))
+    read_status = _parse_read_status(row.get('read_status', False))
+    return {'title': title, 'author': author, 'publication_year': year, 'genre': genre, 'read_status': read_status}
+
+
+def parse_changes(fields):
+    # Validates the fields of a bulk edit; titles and authors identify books
+    # and can't be changed this way
+    parsers = {'publication_year': _parse_year, 'genre': _parse_genre, 'read_status': _parse_read_status}
+    unknown = set(fields) - set(parsers)
+    if unknown:
+        raise ValueError(f"Can't change {', '.join(sorted(unknown))}; only {', '.join(parsers)} can be edited in bulk")
+    if not fields:
+        raise ValueError("No changes given")
+    return {field: parsers[field](value) for field, value in fields.items()}
+
+
+def parse_goal(period, target, genre=None):
+    # Validates a reading goal and returns it as a history event
+    if period not in PERIODS:
+        raise ValueError(f"Goal period {period!r} is not one of {', '.join(PERIODS)}")
+    try:
+        target = int(target)
+    except (TypeError, ValueError):
+        raise ValueError(f"Goal target {target!r} is not a number")
+    if target < 0:
+        raise ValueError("Goal target can't be negative")
+    return {'goal': period, 'genre': _parse_genre(genre) if genre else None, 'target': target}
+
+
+def _parse_year(value):
+    max_year = datetime.now().year
+    try:
+        year = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Publication year {value!r} is not a number")
+    if not MIN_YEAR <= year <= max_year:
+        raise ValueError(f"Publication year {year} is not between {MIN_YEAR} and {max_year}")
+    return year
+
+
+def _parse_genre(genre):
+    if genre not in GENRES:
+        raise ValueError(f"Genre {genre!r} is not one of {', '.join(GENRES)}")
+    return genre
+
+
+def _parse_read_status(read_status):
+    if not isinstance(read_status, bool):
+        text = str(read_status if read_status is not None else '').strip().lower()
+        if text not in TRUE_VALUES | FALSE_VALUES:
+            raise ValueError(f"Read status {read_status!r} is not true or false")
+        read_status = text in TRUE_VALUES
+    return read_status
@@ -1,9 +1,20 @@
 import streamlit as st
 import pandas as pd
+import io
 import json
 import os
 import plotly.express as px
 from datetime import datetime
+from library_core import metrics
+from library_core.backends import open_store
+from library_core.codec import CorruptSnapshotError
+from library_core.library import Library
+from library_core.paging import page_count, page_slice
+from library_core.stats import bin_years
+from library_core.validation import GENRES, MIN_YEAR
+
+# Per-rerun timings; only collected when LIBRARY_METRICS is set
+metrics.begin()
 
 # Set page configuration
 st.set_page_config(
@@ -127,31 +138,54 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # File handling functions with error handling
+def get_store():
+    # JSON journal by default; set LIBRARY_BACKEND=sqlite to use SQLite
+    return open_store()
+
+# Changes are saved in the background this many seconds after the first
+# unsaved one; set LIBRARY_AUTOSAVE_INTERVAL=0 to save every change at once
+AUTOSAVE_INTERVAL = float(os.environ.get('LIBRARY_AUTOSAVE_INTERVAL', 2))
+
+def open_library(books=None):
+    library = Library(get_store(), books=books, autosave_interval=AUTOSAVE_INTERVAL or None)
+    # Index in the background from the start, so the first search rarely
+    # has to wait for it
+    library.build_search_index()
+    return library
+
 def save_library(library):
+    # Full snapshot, after writing any changes autosave still has queued
     try:
-        with open('library.json', 'w') as file:
-            json.dump(library, file)
+        library.save()
     except Exception as e:
         st.error(f"Failed to save library: {e}")
 
+@st.cache_resource
 def load_library():
+    # Loaded once per server process and shared by every session; other
+    # processes sharing the file coordinate with it through the store's locks
     try:
-        if os.path.exists('library.json'):
-            with open('library.json', 'r') as file:
-                return json.load(file)
-        return []
-    except json.JSONDecodeError:
+        return open_library()
+    except (json.JSONDecodeError, KeyError, CorruptSnapshotError):
         st.error("Library file is corrupted. Starting with an empty library.")
-        return []
+        return open_library(books=[])
     except Exception as e:
         st.error(f"Failed to load library: {e}")
-        return []
+        return open_library(books=[])
+
+# The library is shared; session state only holds this session's UI state
+library = load_library()
+try:
+    # Pick up changes other processes made since the last rerun
+    library.refresh()
+except Exception as e:
+    st.error(f"Failed to refresh library: {e}")
 
 # Initialize session state
-if 'library' not in st.session_state:
-    st.session_state.library = load_library()
 if 'search_results' not in st.session_state:
     st.session_state.search_results = []
+if 'last_search' not in st.session_state:
+    st.session_state.last_search = None
 if 'filter_read' not in st.session_state:
     st.session_state.filter_read = "All"
 if 'selected_book' not in st.session_state:
@@ -178,53 +212,178 @@ with st.sidebar:
         if filter_option != st.session_state.filter_read:
             st.session_state.filter_read = filter_option
         
-        if st.button("Save Library", use_container_width=True):
-            save_library(st.session_state.library)
+        if library.read_only:
+            st.info("Read-only archive: adding, editing and removing books is disabled.")
+        elif st.button("Save Library", use_container_width=True):
+            save_library(library)
             st.success("Library saved successfully!")
 
+@st.fragment(run_every=2)
+def autosave_status():
+    # Reruns on its own so the status follows the background writer
+    status = library.autosave_status()
+    if status is None:
+        return
+    if status['last_error'] is not None:
+        st.error(f"Autosave failed, will retry: {status['last_error']}")
+    elif status['pending']:
+        st.caption(f"💾 Saving {status['pending']} change{'s' if status['pending'] != 1 else ''}...")
+    elif status['last_flush'] is not None:
+        st.caption(f"✅ All changes saved · last saved {datetime.fromtimestamp(status['last_flush']):%H:%M:%S}")
+    else:
+        st.caption("✅ All changes saved")
+
+if page != "Exit" and not library.read_only:
+    with st.sidebar:
+        autosave_status()
+
 # Helper functions
-def get_filtered_library():
-    if st.session_state.filter_read == "All":
-        return st.session_state.library
-    if st.session_state.filter_read == "Read":
-        return [book for book in st.session_state.library if book['read_status']]
-    if st.session_state.filter_read == "Unread":
-        return [book for book in st.session_state.library if not book['read_status']]
+READ_FILTERS = {"All": None, "Read": True, "Unread": False}
+BOOK_COLUMNS = {'title': 'Title', 'author': 'Author', 'publication_year': 'Year', 'genre': 'Genre', 'read_status': 'Read Status'}
+READ_STATUS_LABELS = ['📖 Unread', '✅ Read']
+PAGE_SIZES = [25, 50, 100, 250]
+# Only the best matches are ranked and fetched: at most a full table page
+SEARCH_LIMIT = max(PAGE_SIZES)
+RECOMMENDATIONS = 10
+
+def count_filtered_library():
+    return library.count(READ_FILTERS[st.session_state.filter_read])
+
+def get_filtered_library(page=1, page_size=None, sort_by=None, descending=False):
+    # Returns one page of the filtered library, or all of it without page_size
+    return library.page(READ_FILTERS[st.session_state.filter_read], page, page_size, sort_by, descending)
+
+def books_to_frame(books, first_row=1):
+    df = pd.DataFrame(books, columns=list(BOOK_COLUMNS)).rename(columns=BOOK_COLUMNS)
+    # Vectorized icons: the booleans become the codes of a categorical column
+    df['Read Status'] = pd.Categorical.from_codes(df['Read Status'].astype(int), categories=READ_STATUS_LABELS)
+    df.index = pd.RangeIndex(first_row, first_row + len(df))
+    return df
+
+@metrics.timed('table')
+def render_book_table(fetch_page, total, key, height, default_order, selectable=False):
+    # Only the visible page is fetched, converted to a DataFrame and sent to
+    # the browser. With selectable, returns the books selected on this page.
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, index=1, key=f"{key}_page_size")
+    with col2:
+        sort_label = st.selectbox("Sort by", [default_order] + list(BOOK_COLUMNS.values()), key=f"{key}_sort")
+    with col3:
+        descending = st.selectbox("Order", ["Ascending", "Descending"], key=f"{key}_order") == "Descending"
+    with col4:
+        pages = page_count(total, page_size)
+        if st.session_state.get(f"{key}_page", 1) > pages:
+            st.session_state[f"{key}_page"] = pages
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key=f"{key}_page")
+    sort_by = next((field for field, label in BOOK_COLUMNS.items() if label == sort_label), None)
+    books = fetch_page(page, page_size, sort_by, descending)
+    first_row = (page - 1) * page_size + 1
+    if not selectable:
+        st.dataframe(books_to_frame(books, first_row), use_container_width=True, height=height)
+        st.caption(f"Showing {first_row}-{first_row + len(books) - 1} of {total} books")
+        return []
+    event = st.dataframe(books_to_frame(books, first_row), use_container_width=True, height=height,
+                         on_select="rerun", selection_mode="multi-row", key=f"{key}_selection")
+    selected = [books[row] for row in event.selection.rows if row < len(books)]
+    st.caption(f"Showing {first_row}-{first_row + len(books) - 1} of {total} books"
+               + (f" · {len(selected)} selected" if selected else ""))
+    return selected
 
 def get_library_stats():
-    library = st.session_state.library
-    total_books = len(library)
-    read_books = sum(1 for book in library if book['read_status']) if total_books > 0 else 0
-    percent_read = (read_books / total_books * 100) if total_books > 0 else 0
-    
-    genres = {}
-    years = {}
-    for book in library:
-        genres[book['genre']] = genres.get(book['genre'], 0) + 1
-        years[book['publication_year']] = years.get(book['publication_year'], 0) + 1
-    
-    return {"total": total_books, "read": read_books, "percent_read": percent_read, "genres": genres, "years": years}
+    # Aggregates are kept up to date by the catalog on every change
+    return library.summary()
+
+def get_read_counts():
+    # Just the numbers on the stat cards, without copying the per-genre,
+    # year and author tables summary() returns
+    total, read = library.count(), library.count(True)
+    return {"total": total, "read": read, "percent_read": read / total * 100 if total else 0}
+
+# Statistics figures are cached on the aggregates they plot, so they are only
+# rebuilt when those change. Cached figures are shared; don't modify them.
+YEAR_BIN_LABELS = {1: "Publication Year", 10: "Publication Decade", 100: "Publication Century"}
+
+@st.cache_resource(max_entries=32)
+def reading_progress_figure(read, total):
+    fig = px.pie(values=[read, total - read], names=["Read", "Unread"], color_discrete_sequence=["#4CAF50", "#BDBDBD"], hole=0.7)
+    fig.update_layout(annotations=[dict(text=f"{read / total * 100:.1f}%", x=0.5, y=0.5, font_size=20, showarrow=False)])
+    return fig
+
+@st.cache_resource(max_entries=32)
+def genre_figure(genre_counts):
+    genres_df = pd.DataFrame(genre_counts, columns=['Genre', 'Count'])
+    fig = px.bar(genres_df, x='Genre', y='Count', color='Count', color_continuous_scale='Viridis')
+    fig.update_layout(xaxis_title="Genre", yaxis_title="Number of Books")
+    return fig
+
+@st.cache_resource(max_entries=32)
+def publication_years_figure(width, year_counts):
+    # year_counts is already binned, so the chart has at most ~150 points
+    years_df = pd.DataFrame(year_counts, columns=['Year', 'Count'])
+    fig = px.line(years_df, x='Year', y='Count', markers=True, line_shape='linear' if width == 1 else 'hv')
+    fig.update_layout(xaxis_title=YEAR_BIN_LABELS[width], yaxis_title="Number of Books")
+    return fig
+
+@st.cache_resource(max_entries=32)
+def reads_per_month_figure(month_counts):
+    # One bar per month of the reading history, precomputed from day buckets
+    months_df = pd.DataFrame(month_counts, columns=['Month', 'Books Read'])
+    fig = px.bar(months_df, x='Month', y='Books Read', color_discrete_sequence=["#1E88E5"])
+    fig.update_layout(xaxis_title="Month", yaxis_title="Books Read")
+    return fig
+
+@st.cache_resource(max_entries=32)
+def reading_trend_figure(window, trend):
+    trend_df = pd.DataFrame(trend, columns=['Date', 'Books Read'])
+    fig = px.line(trend_df, x='Date', y='Books Read', color_discrete_sequence=["#43a047"])
+    fig.update_layout(xaxis_title="Date", yaxis_title=f"Books Read in the Previous {window} Days")
+    return fig
+
+GOAL_PERIODS = {"Week": "week", "Month": "month", "Year": "year"}
+TREND_WINDOW = 30
+
+def goal_label(goal):
+    books = f"{goal['genre']} book" if goal['genre'] else "book"
+    return f"{goal['target']} {books}{'s' if goal['target'] != 1 else ''} this {goal['period']}"
+
+BULK_ACTIONS = ["Mark as read", "Mark as unread", "Change genre", "Remove"]
+
+def apply_bulk_action(books, action, genre=None):
+    # One journal write for the whole selection; the books carry their
+    # versions, so books another session changed meanwhile are refused
+    if action == "Remove":
+        return library.remove_books(books), "removed"
+    if action == "Change genre":
+        return library.update_books(books, genre=genre), f"moved to {genre}"
+    read = action == "Mark as read"
+    return library.update_books(books, read_status=read), "marked as read" if read else "marked as unread"
 
 def mark_book_as_read():
     if st.session_state.book_to_mark:
-        for book in st.session_state.library:
-            if book['title'].lower() == st.session_state.book_to_mark.lower():
-                book['read_status'] = True
-                st.session_state.book_mark_success = f"'{st.session_state.book_to_mark}' marked as read!"
-                st.session_state.book_to_mark = ""
-                save_library(st.session_state.library)
-                return
-        st.session_state.book_mark_error = f"Book '{st.session_state.book_to_mark}' not found."
+        try:
+            marked = library.mark_read(st.session_state.book_to_mark)
+        except Exception as e:
+            st.error(f"Failed to save library: {e}")
+            st.session_state.book_to_mark = ""
+            return
+        if marked:
+            st.session_state.book_mark_success = f"'{st.session_state.book_to_mark}' marked as read!"
+        else:
+            st.session_state.book_mark_error = f"Book '{st.session_state.book_to_mark}' not found."
         st.session_state.book_to_mark = ""
 
 def remove_book():
     if st.session_state.book_to_remove:
-        initial_len = len(st.session_state.library)
-        st.session_state.library = [book for book in st.session_state.library if book['title'].lower() != st.session_state.book_to_remove.lower()]
-        if len(st.session_state.library) < initial_len:
+        try:
+            removed = library.remove(st.session_state.book_to_remove)
+        except Exception as e:
+            st.error(f"Failed to save library: {e}")
+            st.session_state.book_to_remove = ""
+            return
+        if removed:
             st.session_state.book_remove_success = f"Book '{st.session_state.book_to_remove}' removed!"
             st.session_state.book_to_remove = ""
-            save_library(st.session_state.library)
         else:
             st.session_state.book_remove_error = f"Book '{st.session_state.book_to_remove}' not found."
             st.session_state.book_to_remove = ""
@@ -233,7 +392,7 @@ def remove_book():
 if page == "Library Dashboard":
     st.markdown("<h2 class='sub-header'>My Library</h2>", unsafe_allow_html=True)
     
-    stats = get_library_stats()
+    stats = get_read_counts()
     col1, col2, col3 = st.columns(3)
     with col1:
         st.markdown(f"<div class='stat-card'><div class='stat-label'>Total Books</div><div class='stat-number'>{stats['total']}</div></div>", unsafe_allow_html=True)
@@ -243,58 +402,93 @@ if page == "Library Dashboard":
         st.markdown(f"<div class='stat-card' style='background: linear-gradient(135deg, #7e57c2 0%, #5e35b1 100%);'><div class='stat-label'>Read Percentage</div><div class='stat-number'>{stats['percent_read']:.1f}%</div></div>", unsafe_allow_html=True)
     
     st.markdown("<h3>Your Books</h3>", unsafe_allow_html=True)
-    filtered_library = get_filtered_library()
-    if not filtered_library:
+    total_filtered = count_filtered_library()
+    if not total_filtered:
         st.info("Your library is empty. Add some books to get started!")
     else:
-        df = pd.DataFrame(filtered_library).rename(columns={
-            'title': 'Title',
-            'author': 'Author',
-            'publication_year': 'Year',
-            'genre': 'Genre',
-            'read_status': 'Read Status'
-        })
-        df['Read Status'] = df['Read Status'].apply(lambda x: '✅ Read' if x else '📖 Unread')
-        st.dataframe(df[['Title', 'Author', 'Year', 'Genre', 'Read Status']], use_container_width=True, height=400)
+        selected_books = render_book_table(get_filtered_library, total_filtered, "dashboard_table", 400, "Date Added",
+                                           selectable=not library.read_only)
     
-    st.markdown("<h3>Book Actions</h3>", unsafe_allow_html=True)
-    col1, col2 = st.columns(2)
+    if total_filtered and not library.read_only:
+        with st.expander("Bulk Actions"):
+            scope = st.radio("Apply to", ["Selected rows", "All books matching a filter"], horizontal=True, key="bulk_scope")
+            if scope == "Selected rows":
+                matching = len(selected_books)
+                fetch_targets = lambda: selected_books
+                if not selected_books:
+                    st.caption("Select rows in the table above (click the boxes left of the rows).")
+            else:
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    bulk_genres = st.multiselect("Genres (all if empty)", GENRES, key="bulk_genres")
+                with col2:
+                    bulk_status = st.selectbox("Read status", list(READ_FILTERS), key="bulk_status")
+                with col3:
+                    bulk_years = st.slider("Published", MIN_YEAR, datetime.now().year, (MIN_YEAR, datetime.now().year), key="bulk_years")
+                criteria = dict(read_status=READ_FILTERS[bulk_status], genres=bulk_genres or None,
+                                min_year=bulk_years[0], max_year=bulk_years[1])
+                # Only counted on every rerun; the books are fetched on Apply
+                matching = library.count_matching(**criteria)
+                fetch_targets = lambda: library.select(**criteria)
+            col1, col2 = st.columns(2)
+            with col1:
+                action = st.selectbox("Action", BULK_ACTIONS, key="bulk_action")
+            with col2:
+                new_genre = st.selectbox("New genre", GENRES, key="bulk_genre", disabled=action != "Change genre")
+            confirmed = action != "Remove" or st.checkbox(f"Yes, remove {matching} books", key="bulk_confirm_remove")
+            if st.button(f"{action} ({matching} books)", key="bulk_apply_btn", disabled=not matching or not confirmed, use_container_width=True):
+                try:
+                    changed, verb = apply_bulk_action(fetch_targets(), action, new_genre)
+                    st.session_state.bulk_result = f"{changed} book{'s' if changed != 1 else ''} {verb}."
+                except ValueError as e:
+                    # ConflictError included: the selection is stale
+                    st.session_state.bulk_result = None
+                    st.error(str(e))
+                else:
+                    st.rerun()
+            if st.session_state.get('bulk_result'):
+                st.success(st.session_state.bulk_result)
+                st.session_state.bulk_result = None
     
-    with col1:
-        st.markdown("<div class='card'><h4>Mark Book as Read</h4>", unsafe_allow_html=True)
-        book_to_mark = st.text_input("Enter book title:", key="mark_book_input")
-        if st.button("Mark as Read", key="mark_read_btn", use_container_width=True):
-            st.session_state.book_to_mark = book_to_mark
-            mark_book_as_read()
-        if 'book_mark_success' in st.session_state and st.session_state.book_mark_success:
-            st.success(st.session_state.book_mark_success)
-            if st.button("OK", key="clear_mark_success"):
-                st.session_state.book_mark_success = ""
-                st.rerun()
-        if 'book_mark_error' in st.session_state and st.session_state.book_mark_error:
-            st.error(st.session_state.book_mark_error)
-            if st.button("OK", key="clear_mark_error"):
-                st.session_state.book_mark_error = ""
-                st.rerun()
-        st.markdown("</div>", unsafe_allow_html=True)
+    if not library.read_only:
+        st.markdown("<h3>Book Actions</h3>", unsafe_allow_html=True)
+        col1, col2 = st.columns(2)
     
-    with col2:
-        st.markdown("<div class='card'><h4>Remove Book</h4>", unsafe_allow_html=True)
-        book_to_remove = st.text_input("Enter title of book to remove:", key="remove_book_input")
-        if st.button("Remove Book", key="remove_book_btn", use_container_width=True):
-            st.session_state.book_to_remove = book_to_remove
-            remove_book()
-        if 'book_remove_success' in st.session_state and st.session_state.book_remove_success:
-            st.success(st.session_state.book_remove_success)
-            if st.button("OK", key="clear_remove_success"):
-                st.session_state.book_remove_success = ""
-                st.rerun()
-        if 'book_remove_error' in st.session_state and st.session_state.book_remove_error:
-            st.error(st.session_state.book_remove_error)
-            if st.button("OK", key="clear_remove_error"):
-                st.session_state.book_remove_error = ""
-                st.rerun()
-        st.markdown("</div>", unsafe_allow_html=True)
+        with col1:
+            st.markdown("<div class='card'><h4>Mark Book as Read</h4>", unsafe_allow_html=True)
+            book_to_mark = st.text_input("Enter book title:", key="mark_book_input")
+            if st.button("Mark as Read", key="mark_read_btn", use_container_width=True):
+                st.session_state.book_to_mark = book_to_mark
+                mark_book_as_read()
+            if 'book_mark_success' in st.session_state and st.session_state.book_mark_success:
+                st.success(st.session_state.book_mark_success)
+                if st.button("OK", key="clear_mark_success"):
+                    st.session_state.book_mark_success = ""
+                    st.rerun()
+            if 'book_mark_error' in st.session_state and st.session_state.book_mark_error:
+                st.error(st.session_state.book_mark_error)
+                if st.button("OK", key="clear_mark_error"):
+                    st.session_state.book_mark_error = ""
+                    st.rerun()
+            st.markdown("</div>", unsafe_allow_html=True)
+    
+        with col2:
+            st.markdown("<div class='card'><h4>Remove Book</h4>", unsafe_allow_html=True)
+            book_to_remove = st.text_input("Enter title of book to remove:", key="remove_book_input")
+            if st.button("Remove Book", key="remove_book_btn", use_container_width=True):
+                st.session_state.book_to_remove = book_to_remove
+                remove_book()
+            if 'book_remove_success' in st.session_state and st.session_state.book_remove_success:
+                st.success(st.session_state.book_remove_success)
+                if st.button("OK", key="clear_remove_success"):
+                    st.session_state.book_remove_success = ""
+                    st.rerun()
+            if 'book_remove_error' in st.session_state and st.session_state.book_remove_error:
+                st.error(st.session_state.book_remove_error)
+                if st.button("OK", key="clear_remove_error"):
+                    st.session_state.book_remove_error = ""
+                    st.rerun()
+            st.markdown("</div>", unsafe_allow_html=True)
 
 # Add Book Page
 elif page == "Add Book":
@@ -307,58 +501,79 @@ elif page == "Add Book":
         col1, col2 = st.columns(2)
         with col1:
             current_year = datetime.now().year
-            year = st.number_input("Publication Year", min_value=1000, max_value=current_year, value=min(2023, current_year), key="add_year")
+            year = st.number_input("Publication Year", min_value=MIN_YEAR, max_value=current_year, value=min(2023, current_year), key="add_year")
         with col2:
-            genre = st.selectbox("Genre", ["Fiction", "Non-fiction", "Mystery", "Science Fiction", "Fantasy", "Biography", "History", "Self-help", "Romance", "Thriller", "Other"], key="add_genre")
+            genre = st.selectbox("Genre", GENRES, key="add_genre")
         read_status = st.checkbox("I have read this book", key="add_read_status")
         submitted = st.form_submit_button("Add Book", use_container_width=True)
         st.markdown("</div>", unsafe_allow_html=True)
         
         if submitted:
-            if not title.strip() or not author.strip():
-                st.error("Title and author are required fields!")
-            elif any(book['title'].lower() == title.lower() and book['author'].lower() == author.lower() for book in st.session_state.library):
-                st.error(f"'{title}' by {author} is already in your library!")
+            try:
+                library.add({'title': title, 'author': author, 'publication_year': year, 'genre': genre, 'read_status': read_status})
+            except ValueError as e:
+                # Validation and duplicate errors
+                st.error(str(e))
+            except Exception as e:
+                st.error(f"Failed to save library: {e}")
             else:
-                new_book = {'title': title, 'author': author, 'publication_year': year, 'genre': genre, 'read_status': read_status}
-                st.session_state.library.append(new_book)
-                save_library(st.session_state.library)
                 st.success(f"'{title}' by {author} added to your library!")
+    
+    with st.expander("Bulk Import"):
+        st.write("Import many books at once from a CSV, JSON Lines or Parquet file with the columns "
+                 "title, author, publication_year, genre and read_status. Rows are checked with the same rules as the form above.")
+        uploaded = st.file_uploader("Library file", type=["csv", "jsonl", "ndjson", "parquet"], key="bulk_import_file")
+        if uploaded is not None and st.button("Import Books", key="bulk_import_btn", use_container_width=True):
+            progress_bar = st.progress(0.0, text="Importing...")
+            def show_progress(fraction, result):
+                progress_bar.progress(min(fraction, 1.0), text=f"Imported {result['imported']} books...")
+            try:
+                result = library.import_file(uploaded, progress=show_progress)
+            except Exception as e:
+                st.error(f"Import failed: {e}")
+            else:
+                st.success(f"Imported {result['imported']} books, skipped {result['duplicates']} duplicates and {result['invalid']} invalid rows.")
+                for error in result['errors']:
+                    st.warning(error)
+    
+    with st.expander("Export Library"):
+        export_format = st.selectbox("Format", ["csv", "jsonl", "parquet"], key="export_format")
+        if st.button("Prepare Export", key="prepare_export_btn", use_container_width=True):
+            buffer = io.BytesIO()
+            try:
+                library.export_file(buffer, export_format)
+                st.session_state.export_data = (export_format, buffer.getvalue())
+            except Exception as e:
+                st.error(f"Export failed: {e}")
+        if st.session_state.get('export_data') and st.session_state.export_data[0] == export_format:
+            st.download_button("Download", st.session_state.export_data[1], file_name=f"library.{export_format}", use_container_width=True)
 
 # Search Books Page
 elif page == "Search Books":
     st.markdown("<h2 class='sub-header'>Search for Books</h2>", unsafe_allow_html=True)
     
     with st.expander("Search Options", expanded=True):
-        search_type = st.radio("Search by:", ["Title", "Author", "Genre"])
-        search_query = st.text_input(f"Enter {search_type.lower()} to search:", key="search_query")
+        search_type = st.radio("Search by:", ["All Fields", "Title", "Author", "Genre"])
+        search_label = "title, author or genre" if search_type == "All Fields" else search_type.lower()
+        search_query = st.text_input(f"Enter {search_label} to search:", key="search_query")
         
-        if st.button("Search", use_container_width=True):
+        # Search as soon as the query or field changes; the button re-runs it
+        if st.button("Search", use_container_width=True) or (search_query and (search_type, search_query) != st.session_state.last_search):
+            st.session_state.last_search = (search_type, search_query)
             if search_query:
-                results = []
-                search_query = search_query.lower()
-                for book in st.session_state.library:
-                    if search_type == "Title" and search_query in book['title'].lower():
-                        results.append(book)
-                    elif search_type == "Author" and search_query in book['author'].lower():
-                        results.append(book)
-                    elif search_type == "Genre" and search_query in book['genre'].lower():
-                        results.append(book)
+                field = None if search_type == "All Fields" else search_type.lower()
+                results = library.search(search_query, field=field, limit=SEARCH_LIMIT)
                 st.session_state.search_results = results
                 if not results:
-                    st.info(f"No books found matching '{search_query}' in {search_type.lower()}.")
+                    st.info(f"No books found matching '{search_query}' in {search_label}.")
     
     if st.session_state.search_results:
-        st.markdown(f"<h3>Search Results ({len(st.session_state.search_results)} books found)</h3>", unsafe_allow_html=True)
-        df = pd.DataFrame(st.session_state.search_results).rename(columns={
-            'title': 'Title',
-            'author': 'Author',
-            'publication_year': 'Year',
-            'genre': 'Genre',
-            'read_status': 'Read Status'
-        })
-        df['Read Status'] = df['Read Status'].apply(lambda x: '✅ Read' if x else '📖 Unread')
-        st.dataframe(df[['Title', 'Author', 'Year', 'Genre', 'Read Status']], use_container_width=True, height=300)
+        found = len(st.session_state.search_results)
+        summary = f"top {found} matches" if found == SEARCH_LIMIT else f"{found} books found"
+        st.markdown(f"<h3>Search Results ({summary})</h3>", unsafe_allow_html=True)
+        results = st.session_state.search_results
+        render_book_table(lambda page, page_size, sort_by, descending: page_slice(results, page, page_size, sort_by, descending),
+                          len(results), "search_table", 300, "Relevance")
 
 # Statistics Page
 elif page == "Statistics":
@@ -371,9 +586,8 @@ elif page == "Statistics":
         col1, col2 = st.columns(2)
         with col1:
             st.markdown("<div class='card'><h3>Reading Progress</h3>", unsafe_allow_html=True)
-            fig = px.pie(values=[stats["read"], stats["total"] - stats["read"]], names=["Read", "Unread"], color_discrete_sequence=["#4CAF50", "#BDBDBD"], hole=0.7)
-            fig.update_layout(annotations=[dict(text=f"{stats['percent_read']:.1f}%", x=0.5, y=0.5, font_size=20, showarrow=False)])
-            st.plotly_chart(fig, use_container_width=True)
+            with metrics.timed('chart.reading_progress'):
+                st.plotly_chart(reading_progress_figure(stats["read"], stats["total"]), use_container_width=True)
             st.markdown(f"""
             <ul>
                 <li>Total Books: {stats["total"]}</li>
@@ -387,28 +601,23 @@ elif page == "Statistics":
         with col2:
             st.markdown("<div class='card'><h3>Genre Distribution</h3>", unsafe_allow_html=True)
             if stats["genres"]:
-                genres_df = pd.DataFrame({'Genre': list(stats["genres"].keys()), 'Count': list(stats["genres"].values())})
-                fig = px.bar(genres_df, x='Genre', y='Count', color='Count', color_continuous_scale='Viridis')
-                fig.update_layout(xaxis_title="Genre", yaxis_title="Number of Books")
-                st.plotly_chart(fig, use_container_width=True)
+                with metrics.timed('chart.genres'):
+                    st.plotly_chart(genre_figure(tuple(sorted(stats["genres"].items()))), use_container_width=True)
             else:
                 st.write("No genre data available.")
             st.markdown("</div>", unsafe_allow_html=True)
         
         st.markdown("<div class='card'><h3>Publication Years</h3>", unsafe_allow_html=True)
         if stats["years"]:
-            years_df = pd.DataFrame({'Year': list(stats["years"].keys()), 'Count': list(stats["years"].values())}).sort_values('Year')
-            fig = px.line(years_df, x='Year', y='Count', markers=True, line_shape='linear')
-            fig.update_layout(xaxis_title="Publication Year", yaxis_title="Number of Books")
-            st.plotly_chart(fig, use_container_width=True)
+            with metrics.timed('chart.publication_years'):
+                width, year_counts = bin_years(stats["years"])
+                st.plotly_chart(publication_years_figure(width, tuple(year_counts)), use_container_width=True)
         else:
             st.write("No publication year data available.")
         st.markdown("</div>", unsafe_allow_html=True)
         
         st.markdown("<div class='card'><h3>Your Reading Habits</h3>", unsafe_allow_html=True)
-        authors = {}
-        for book in st.session_state.library:
-            authors[book['author']] = authors.get(book['author'], 0) + 1
+        authors = stats["authors"]
         favorite_author = max(authors.items(), key=lambda x: x[1])[0] if authors else "None"
         favorite_genre = max(stats["genres"].items(), key=lambda x: x[1])[0] if stats["genres"] else "None"
         avg_year = sum(int(year) * count for year, count in stats["years"].items()) / stats["total"] if stats["years"] else "N/A"
@@ -421,6 +630,62 @@ elif page == "Statistics":
         </ul>
         """, unsafe_allow_html=True)
         st.markdown("</div>", unsafe_allow_html=True)
+        
+        st.markdown("<div class='card'><h3>Reading Goals</h3>", unsafe_allow_html=True)
+        goals = library.goal_progress()
+        for goal in goals:
+            st.progress(min(goal['read'] / goal['target'], 1.0), text=f"{goal_label(goal)}: {goal['read']} read")
+            if goal['read'] >= goal['target']:
+                st.caption(f"Goal reached! 🎉 The {goal['period']} ends on {goal['end']:%B %d}.")
+            elif goal['read'] >= goal['expected']:
+                st.caption(f"On track. The {goal['period']} ends on {goal['end']:%B %d}.")
+            else:
+                st.caption(f"{goal['expected'] - goal['read']:.1f} books behind a steady pace. The {goal['period']} ends on {goal['end']:%B %d}.")
+        if not goals:
+            st.write("No reading goals yet.")
+        if not library.read_only:
+            with st.expander("Set a goal"):
+                with st.form("goal_form"):
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        goal_target = st.number_input("Books", min_value=0, value=4, step=1, key="goal_target")
+                    with col2:
+                        goal_period = st.selectbox("Per", list(GOAL_PERIODS), index=1, key="goal_period")
+                    with col3:
+                        goal_genre = st.selectbox("Genre", ["Any genre"] + GENRES, key="goal_genre")
+                    st.caption("Setting 0 books removes the goal.")
+                    if st.form_submit_button("Save Goal", use_container_width=True):
+                        try:
+                            library.set_goal(GOAL_PERIODS[goal_period], goal_target, None if goal_genre == "Any genre" else goal_genre)
+                        except ValueError as e:
+                            st.error(str(e))
+                        else:
+                            st.rerun()
+        st.markdown("</div>", unsafe_allow_html=True)
+        
+        st.markdown("<div class='card'><h3>Reading Trends</h3>", unsafe_allow_html=True)
+        month_counts = library.reads_per_month()
+        if month_counts:
+            # Both charts are read off the history's per-day buckets, however many years it spans
+            with metrics.timed('chart.reads_per_month'):
+                st.plotly_chart(reads_per_month_figure(tuple(month_counts)), use_container_width=True)
+            with metrics.timed('chart.reading_trend'):
+                st.plotly_chart(reading_trend_figure(TREND_WINDOW, tuple(library.reading_trend(window=TREND_WINDOW))), use_container_width=True)
+        else:
+            st.write("Books you mark as read are charted here by the date you read them.")
+        st.markdown("</div>", unsafe_allow_html=True)
+        
+        st.markdown("<div class='card'><h3>Recommended for You</h3>", unsafe_allow_html=True)
+        recommendations = library.recommend(RECOMMENDATIONS)
+        if recommendations:
+            # Unread books most like the ones you have read, by author, genre, era and title words
+            df = pd.DataFrame(recommendations, columns=['title', 'author', 'publication_year', 'genre', 'score'])
+            df['score'] *= 100
+            st.dataframe(df.rename(columns={**BOOK_COLUMNS, 'score': 'Match'}), hide_index=True, use_container_width=True,
+                         column_config={'Match': st.column_config.ProgressColumn('Match', format='%.0f%%', min_value=0, max_value=100)})
+        else:
+            st.write("Mark some books as read to get recommendations from your unread ones.")
+        st.markdown("</div>", unsafe_allow_html=True)
 
 # About Creator Page
 elif page == "About Creator":
@@ -481,7 +746,7 @@ elif page == "About Creator":
             </div>
             <div style="flex: 1; min-width: 300px;">
                 <p><span class="feature-icon">🔍</span> <strong>Powerful Search</strong></p>
-                <p>Quickly find books by title, author, or genre. No more searching through physical shelves.</p>
+                <p>Quickly find books by title, author, or genre, with search-as-you-type and typo-tolerant matching. No more searching through physical shelves.</p>
             </div>
             <div style="flex: 1; min-width: 300px;">
                 <p><span class="feature-icon">💾</span> <strong>Automatic Saving</strong></p>
@@ -499,9 +764,7 @@ elif page == "About Creator":
         <h3>Future Plans</h3>
         <p>I'm continuously working to improve this application. Future updates may include:</p>
         <ul>
-            <li>Book recommendations based on your reading history</li>
             <li>Integration with online book databases</li>
-            <li>Reading challenges and goals</li>
             <li>Mobile companion app</li>
         </ul>
         <p style="text-align: center; margin-top: 30px; font-style: italic;">Thank you for using my Personal Library Manager!</p>
@@ -521,14 +784,14 @@ elif page == "Exit":
     col1, col2 = st.columns(2)
     with col1:
         if st.button("Save and Exit", use_container_width=True):
-            save_library(st.session_state.library)
+            save_library(library)
             st.success("Library saved successfully!")
             st.markdown("<div class='exit-btn'>You can now close this window</div>", unsafe_allow_html=True)
     with col2:
         if st.button("Exit Without Saving", use_container_width=True):
             st.markdown("<div class='exit-btn'>You can now close this window</div>", unsafe_allow_html=True)
     
-    stats = get_library_stats()
+    stats = get_read_counts()
     if stats["total"] > 0:
         st.markdown("<h3>Your Library Summary</h3>", unsafe_allow_html=True)
         col1, col2, col3 = st.columns(3)
@@ -542,4 +805,19 @@ elif page == "Exit":
 
 # Footer
 st.markdown("---")
-st.markdown("<p style='text-align: center; color: gray;'>© 2025 Personal Library Manager | Created by Riaz Hussain</p>", unsafe_allow_html=True)
\ No newline at end of file
+st.markdown("<p style='text-align: center; color: gray;'>© 2025 Personal Library Manager | Created by Riaz Hussain</p>", unsafe_allow_html=True)
+
+# Debug panel: where this rerun spent its time (set LIBRARY_METRICS=1)
+if metrics.enabled():
+    rerun = metrics.end(page=page)
+    with st.sidebar.expander("⏱ Performance"):
+        st.markdown(f"**This rerun:** {rerun['seconds'] * 1000:.1f} ms")
+        if rerun['operations']:
+            timings = pd.DataFrame([(name, op['calls'], op['seconds'] * 1000) for name, op in rerun['operations'].items()],
+                                   columns=['Operation', 'Calls', 'ms']).sort_values('ms', ascending=False)
+            st.dataframe(timings, hide_index=True, use_container_width=True)
+            st.caption("Times are inclusive; nested operations overlap.")
+        for name, n in rerun['counters'].items():
+            st.markdown(f"- {name}: {n}")
+        percentiles = metrics.rerun_percentiles()
+        st.markdown("**Recent reruns:** " + ", ".join(f"p{p} {seconds * 1000:.0f} ms" for p, seconds in percentiles.items()))
\ No newline at end of file
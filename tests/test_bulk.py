@@ -0,0 +1,45 @@
+from library_core.bulk import MAX_REPORTED_ERRORS, import_books
+
+
+def test_bad_json_lines_count_as_invalid_rows(tmp_path):
+    source = tmp_path / 'books.jsonl'
+    source.write_text('{"title": "Dune", "author": "Frank Herbert", "publication_year": 1965, "genre": "Fiction"}\n'
+                      '{"title": "cut short\n'
+                      '[1, 2]\n'
+                      '{"title": "Emma", "author": "Jane Austen", "publication_year": 1815, "genre": "Romance"}\n')
+    committed = []
+    result = import_books(str(source), 'jsonl', lambda books: committed.extend(books) or len(books), chunk_size=1)
+    assert [book['title'] for book in committed] == ['Dune', 'Emma']
+    assert (result['imported'], result['invalid']) == (2, 2)
+    assert [error.split(':')[0] for error in result['errors']] == ['Row 2', 'Row 3']
+
+
+def test_invalid_rows_are_counted_and_reported(tmp_path):
+    source = tmp_path / 'books.csv'
+    source.write_text('title,author,publication_year,genre,read_status\n'
+                      'Dune,Frank Herbert,1965,Fiction,yes\n'
+                      ',Nobody,2000,Other,no\n'
+                      'Emma,Jane Austen,not a year,Romance,no\n'
+                      'Emma,Jane Austen,999,Romance,no\n'
+                      'Emma,Jane Austen,1815,Poetry,no\n'
+                      'Emma,Jane Austen,1815,Romance,maybe\n'
+                      'Emma,Jane Austen,1815,Romance,\n'
+                      'EMMA, jane austen ,1815,Romance,true\n'
+                      'Dune,Frank Herbert,1965,Fiction,no\n', encoding='utf-8')
+    committed = []
+    seen = []
+    result = import_books(str(source), 'csv', lambda books: committed.extend(books) or len(books),
+                          chunk_size=4, progress=lambda fraction, result: seen.append(fraction))
+    assert [(book['title'], book['read_status']) for book in committed] == [('Dune', True), ('Emma', False)]
+    assert (result['imported'], result['duplicates'], result['invalid']) == (2, 2, 5)
+    assert [error.split(':')[0] for error in result['errors']] == ['Row 2', 'Row 3', 'Row 4', 'Row 5', 'Row 6']
+    assert 'not a number' in result['errors'][1] and "'Poetry'" in result['errors'][3]
+    assert seen[-1] == 1.0
+
+
+def test_reported_errors_are_capped(tmp_path):
+    source = tmp_path / 'books.jsonl'
+    source.write_text('{"title": "", "author": "Nobody"}\n' * (MAX_REPORTED_ERRORS + 5))
+    result = import_books(str(source), 'jsonl', lambda books: len(books))
+    assert result['invalid'] == MAX_REPORTED_ERRORS + 5
+    assert len(result['errors']) == MAX_REPORTED_ERRORS
@@ -0,0 +1,31 @@
+import pytest
+
+from library_core import codec
+
+
+def book(book_id, title, author='Someone', genre='Other', year=2000, read=False):
+    return {'id': book_id, 'title': title, 'author': author, 'publication_year': year, 'genre': genre,
+            'read_status': read, 'version': book_id + 1}
+
+
+def test_empty_binary_snapshot():
+    data = codec.dumps_snapshot([], 5, 'binary')
+    assert codec.is_binary(data) and codec.peek_seq(data) == 5
+    assert codec.loads_snapshot(data) == ([], 5)
+
+
+def test_binary_snapshot_round_trips_non_ascii_text():
+    books = [book(1, 'Cien años de soledad', 'Gabriel García Márquez', 'Ficción', 1967, True),
+             book(2, 'Война и мир', 'Лев Толстой', 'Ficción', 1869),
+             book(3, '吾輩は猫である', '夏目漱石', 'Other', 1905),
+             book(4, 'Dune', 'Frank Herbert', 'Other', 1965, True)]
+    assert codec.loads_snapshot(codec.dumps_snapshot(books, 42, 'binary')) == (books, 42)
+    assert codec.loads_snapshot(codec.dumps_snapshot(books, 42)) == (books, 42)
+
+
+# -8 cuts through the read flags, past the padding after them
+@pytest.mark.parametrize('end', [6, 20, 200, -8])
+def test_truncated_binary_snapshot(end):
+    data = codec.dumps_snapshot([book(i, f'title {i}') for i in range(10)], 1, 'binary')
+    with pytest.raises(codec.CorruptSnapshotError):
+        codec.loads_snapshot(data[:end])
@@ -0,0 +1,82 @@
+import os
+from datetime import date, datetime
+
+import pytest
+
+from library_core.history import ReadingHistory
+from library_core.library import Library
+from library_core.storage import JournalStore
+
+
+def book(title, genre='Other'):
+    return {'title': title, 'author': 'Someone', 'publication_year': 2000, 'genre': genre}
+
+
+def test_autosave_writes_reads_with_the_journal(tmp_path):
+    path = str(tmp_path / 'library.json')
+    library = Library(JournalStore(path), autosave_interval=60)
+    library.add(book('Dune', 'Fantasy'))
+    library.mark_read('Dune')
+    assert not os.path.exists(path + '.history')
+    assert library.flush() == 2
+    other = Library(JournalStore(path))
+    assert other.count(True) == 1
+    assert other.read_date(other.search('Dune')[0]['id']) == date.today()
+    # Reading the history writes what is queued first
+    library.update_books([other.search('Dune')[0]['id']], read_status=False)
+    assert library.reads_per_month() == [(date.today().replace(day=1), 0)]
+    assert other.read_date(other.search('Dune')[0]['id']) is None
+    library.close()
+
+
+def at(day):
+    # Noon, so the local date doesn't depend on the time zone or DST
+    return datetime.combine(day, datetime.min.time()).replace(hour=12).timestamp()
+
+
+def reads():
+    return [{'id': 1, 'genre': 'Fantasy', 'read': True, 't': at(date(2024, 1, 10))},
+            {'id': 2, 'genre': 'Romance', 'read': True, 't': at(date(2024, 1, 20))},
+            {'id': 3, 'genre': 'Fantasy', 'read': True, 't': at(date(2024, 3, 5))},
+            # Unread, then read again later: counts on the last day only
+            {'id': 2, 'genre': 'Romance', 'read': False, 't': at(date(2024, 1, 25))},
+            {'id': 1, 'genre': 'Fantasy', 'read': True, 't': at(date(2024, 3, 20))},
+            {'goal': 'month', 'genre': None, 'target': 4, 't': at(date(2024, 1, 1))},
+            {'goal': 'year', 'genre': 'Fantasy', 'target': 10, 't': at(date(2024, 1, 1))},
+            {'goal': 'week', 'genre': None, 'target': 1, 't': at(date(2024, 1, 1))},
+            {'goal': 'week', 'genre': None, 'target': 0, 't': at(date(2024, 1, 2))}]
+
+
+def check(history):
+    assert history.read_date(1) == date(2024, 3, 20)
+    assert history.read_date(2) is None and history.read_date(4) is None
+    assert history.count(date(2024, 1, 1), date(2024, 12, 31)) == 2
+    assert history.count(date(2024, 3, 5), date(2024, 3, 5), genre='Fantasy') == 1
+    assert history.count(date(2024, 3, 6), date(2024, 3, 19)) == 0
+    assert history.count(date(2023, 1, 1), date(2023, 12, 31), genre='Romance') == 0
+    assert history.per_month() == [(date(2024, 1, 1), 0), (date(2024, 2, 1), 0), (date(2024, 3, 1), 2)]
+    assert history.per_month(date(2024, 3, 1), date(2024, 4, 30), genre='Romance') == [(date(2024, 3, 1), 0), (date(2024, 4, 1), 0)]
+    assert history.rolling(10, date(2024, 3, 4), date(2024, 3, 6)).tolist() == [0, 1, 1]
+    progress = history.progress(today=date(2024, 3, 16))
+    assert [(goal['period'], goal['genre'], goal['target'], goal['read']) for goal in progress] == [('month', None, 4, 1), ('year', 'Fantasy', 10, 1)]
+    assert progress[0]['start'] == date(2024, 3, 1) and progress[0]['end'] == date(2024, 3, 31)
+    assert progress[0]['expected'] == pytest.approx(4 * 16 / 31)
+
+
+def test_reading_history_windows_and_goals():
+    history = ReadingHistory()
+    assert history.per_month() == [] and history.count(date(2024, 1, 1), date(2024, 12, 31)) == 0
+    history.record(reads())
+    check(history)
+
+
+def test_reading_history_log_is_read_back(tmp_path):
+    path = tmp_path / 'library.json.history'
+    ReadingHistory(str(path)).record(reads())
+    # A crash in the middle of the next append
+    with open(path, 'ab') as file:
+        file.write(b'{"id": 9, "genre": "Fantasy", "re')
+    history = ReadingHistory(str(path))
+    check(history)
+    history.record([{'id': 5, 'genre': 'Romance', 'read': True, 't': at(date(2024, 2, 2))}])
+    assert ReadingHistory(str(path)).per_month(genre='Romance')[1] == (date(2024, 2, 1), 1)
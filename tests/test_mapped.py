@@ -0,0 +1,65 @@
+import pytest
+
+from library_core import codec
+from library_core.mapped import MappedCatalog, MappedStore, ReadOnlyError
+from library_core.storage import atomic_write
+
+BOOKS = [
+    {'id': 10, 'title': 'emma', 'author': 'Jane Austen', 'publication_year': 1815, 'genre': 'Romance', 'read_status': True, 'version': 2},
+    {'id': 3, 'title': 'Dune', 'author': 'Frank Herbert', 'publication_year': 1965, 'genre': 'Fiction', 'read_status': False, 'version': 1},
+    {'id': 7, 'title': 'Émile', 'author': 'Jean-Jacques Rousseau', 'publication_year': 1762, 'genre': 'Other', 'read_status': False, 'version': 1},
+    {'id': 12, 'title': 'Emma', 'author': 'Someone Else', 'publication_year': 2001, 'genre': 'Romance', 'read_status': True, 'version': 1},
+    {'id': 5, 'title': 'Animal Farm', 'author': 'George Orwell', 'publication_year': 1945, 'genre': 'Fiction', 'read_status': False, 'version': 1},
+]
+
+
+@pytest.fixture
+def archive(tmp_path):
+    path = str(tmp_path / 'library.bin')
+    atomic_write(path, codec.dumps_snapshot(BOOKS, 9, 'binary'))
+    catalog = MappedCatalog(path)
+    yield catalog
+    catalog.close()
+
+
+def test_lookups(archive):
+    assert (archive.seq, len(archive)) == (9, 5)
+    assert list(archive) == BOOKS
+    assert archive.get(2) == BOOKS[2] and archive.get(5) is None and archive.get(-1) is None
+    assert [archive.key_for_id(book_id) for book_id in (3, 5, 7, 10, 12, 4, 13)] == [1, 4, 2, 0, 3, None, None]
+    assert archive.id_of(3) == 12
+    assert sorted(archive.keys_for_title('EMMA')) == [0, 3]
+    assert archive.keys_for_title('Émile') == [2]
+    assert archive.keys_for_title('Moby Dick') == []
+    assert archive.contains('emma', 'someone else') and not archive.contains('Dune', 'Jane Austen')
+
+
+def test_rows_and_paging(archive):
+    assert list(archive.rows()) == [0, 1, 2, 3, 4]
+    assert list(archive.rows(read_status=True)) == [0, 3]
+    assert list(archive.rows(read_status=False, descending=True)) == [4, 2, 1]
+    assert [archive.get(int(key))['title'] for key in archive.rows(sort_by='title')] == ['Animal Farm', 'Dune', 'emma', 'Emma', 'Émile']
+    assert list(archive.rows(sort_by='publication_year', descending=True)[:2]) == [3, 1]
+    assert list(archive.rows(read_status=False, sort_by='author')) == [1, 4, 2]
+
+
+def test_store_pages_and_refuses_changes(tmp_path):
+    from library_core.library import Library
+
+    path = str(tmp_path / 'library.bin')
+    atomic_write(path, codec.dumps_snapshot(BOOKS, 9, 'binary'))
+    library = Library(MappedStore(path))
+    assert [b['id'] for b in library.page(page=2, page_size=2)] == [7, 12]
+    assert [b['id'] for b in library.page(read_status=False, page=1, page_size=2, sort_by='publication_year')] == [7, 5]
+    assert library.count(True) == 2
+    with pytest.raises(ReadOnlyError):
+        library.add({'title': 'New', 'author': 'Someone', 'publication_year': 2000, 'genre': 'Other'})
+    library.close()
+
+
+def test_not_a_binary_snapshot(tmp_path):
+    path = tmp_path / 'library.bin'
+    for data in (b'', codec.dumps_snapshot(BOOKS, 1)):
+        path.write_bytes(data)
+        with pytest.raises(codec.CorruptSnapshotError):
+            MappedCatalog(str(path))
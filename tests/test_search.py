@@ -0,0 +1,31 @@
+import threading
+
+from library_core.catalog import Backfill, Catalog
+from library_core.search import SearchIndex
+
+
+def book(book_id, title):
+    return {'id': book_id, 'title': title, 'author': 'Someone', 'publication_year': 2000, 'genre': 'Other', 'read_status': False}
+
+
+def test_index_built_in_the_background_follows_changes():
+    catalog = Catalog(book(i, f'title {i}') for i in range(300))
+    lock = threading.RLock()
+    backfill = Backfill(catalog, SearchIndex(), lock, chunk=7)
+    for i in range(300, 400):
+        with lock:
+            catalog.add(book(i, f'title {i}'))
+            catalog.remove(catalog.key_for_id(i - 250))
+            catalog.update(catalog.key_for_id(i - 100), title=f'renamed {i}')
+    index = backfill.wait()
+    expected = SearchIndex()
+    catalog.subscribe(expected)
+    for query in ('title', 'renamed', 'title 42', 'title 350'):
+        assert sorted(index.search(query)) == sorted(expected.search(query))
+
+
+def test_one_letter_matches_exactly():
+    index = SearchIndex()
+    Catalog([book(1, 'A Tale'), book(2, 'Atlas'), book(3, 'Animal Farm')]).subscribe(index)
+    assert index.search('a') == [0]
+    assert sorted(index.search('at')) == [1]
@@ -0,0 +1,178 @@
+import itertools
+import os
+import sqlite3
+
+import pytest
+
+from library_core.library import Library
+from library_core.sqlite_store import SqliteStore
+from library_core.storage import ConflictError, JournalStore
+
+
+def book(title, genre='Other'):
+    return {'title': title, 'author': 'Someone', 'publication_year': 2000, 'genre': genre}
+
+
+def open_library(tmp_path):
+    return Library(JournalStore(str(tmp_path / 'library.json')))
+
+
+def test_refresh_after_another_store_saves(tmp_path):
+    # save() deletes the journal; the next one may get the same inode
+    first, second = open_library(tmp_path), open_library(tmp_path)
+    for i in range(3):
+        first.add(book(f'first {i}'))
+    second.refresh()
+    second.save()
+    for i in range(5):
+        second.add(book(f'a longer title for book number {i}'))
+    first.refresh()
+    assert sorted(b['title'] for b in first) == sorted(b['title'] for b in second)
+    first.add(book('after the save'))
+    assert len(open_library(tmp_path)) == 9
+
+
+@pytest.mark.parametrize('same_store', [True, False])
+def test_torn_append_longer_than_a_chunk(tmp_path, same_store):
+    library = open_library(tmp_path)
+    library.add(book('kept'))
+    library.add(book('also kept'))
+    # A crash in the middle of writing a large bulk entry
+    with open(library.store.journal_path, 'ab') as file:
+        file.write(b'{"op":"remove","ids":[' + b'1234567890,' * 20000)
+    writer = library if same_store else open_library(tmp_path)
+    writer.add(book('written after the crash'))
+    titles = {b['title'] for b in open_library(tmp_path)}
+    assert titles == {'kept', 'also kept', 'written after the crash'}
+
+
+def test_torn_header(tmp_path):
+    library = open_library(tmp_path)
+    with open(library.store.journal_path, 'wb') as file:
+        file.write(b'{"jour')
+    library.add(book('first'))
+    assert [b['title'] for b in open_library(tmp_path)] == ['first']
+
+
+def test_stale_version_conflicts(tmp_path):
+    first, second = open_library(tmp_path), open_library(tmp_path)
+    first.add(book('Dune'))
+    second.refresh()
+    seen = second.search('Dune')[0]
+    first.mark_read('Dune')
+    with pytest.raises(ConflictError):
+        second.mark_read('Dune', expected_version=seen['version'])
+    with pytest.raises(ConflictError):
+        second.update_books([seen], genre='Fantasy')
+    fresh = second.search('Dune')[0]
+    assert fresh['read_status']
+    second.remove('Dune', expected_version=fresh['version'])
+    assert len(open_library(tmp_path)) == 0
+
+
+def test_plain_list_library_is_numbered_once(tmp_path):
+    # library.json as the app wrote it before the journal
+    path = tmp_path / 'library.json'
+    path.write_text('[{"title": "Dune", "author": "Frank Herbert", "publication_year": 1965, "genre": "Fiction", "read_status": false},'
+                    ' {"title": "Emma", "author": "Jane Austen", "publication_year": 1815, "genre": "Romance", "read_status": true}]')
+    library = open_library(tmp_path)
+    assert [(b['id'], b['title']) for b in library] == [(1, 'Dune'), (2, 'Emma')]
+    library.update_books([1], read_status=True)
+    assert [b['read_status'] for b in open_library(tmp_path)] == [True, True]
+
+
+def test_import_without_new_books_keeps_other_stores_changes(tmp_path):
+    first, second = open_library(tmp_path), open_library(tmp_path)
+    first.add(book('one'))
+    second.refresh()
+    second.add(book('two'))
+    source = tmp_path / 'invalid.csv'
+    source.write_text('title,author,publication_year,genre\n,Nobody,2000,Other\n')
+    assert first.import_file(str(source))['imported'] == 0
+    assert first.refresh() == 1
+    first.save()
+    assert sorted(b['title'] for b in open_library(tmp_path)) == ['one', 'two']
+
+
+def test_append_behind_other_stores_conflicts(tmp_path):
+    first, second = JournalStore(str(tmp_path / 'library.json')), JournalStore(str(tmp_path / 'library.json'))
+    first.load()
+    second.load()
+    second.append({'op': 'add', 'book': dict(book('two'), id=2)})
+    with pytest.raises(ConflictError):
+        first.append({'op': 'add', 'book': dict(book('one'), id=1)})
+    with first.locked() as changes:
+        assert [entry['book']['title'] for entry in changes] == ['two']
+        first.append({'op': 'add', 'book': dict(book('one'), id=1)})
+    assert sorted(b['title'] for b in JournalStore(str(tmp_path / 'library.json')).load()) == ['one', 'two']
+
+
+def test_sqlite_writes_keep_the_write_lock(tmp_path):
+    path = str(tmp_path / 'library.db')
+    store = SqliteStore(path)
+    other = sqlite3.connect(path, timeout=0)
+    with store.locked():
+        store.append({'op': 'add', 'book': dict(book('one'), id=1, read_status=False)})
+        store.save([dict(book('two'), id=2, read_status=False)])
+        with pytest.raises(sqlite3.OperationalError):
+            other.execute('BEGIN IMMEDIATE')
+    assert [b['title'] for b in store.load()] == ['two']
+    other.close()
+    store.close()
+
+
+def test_snapshots_keep_the_file_mode(tmp_path):
+    library = open_library(tmp_path)
+    library.add(book('Dune'))
+    library.save()
+    path = tmp_path / 'library.json'
+    assert path.stat().st_mode & 0o777 == 0o666 & ~_umask()
+    path.chmod(0o640)
+    library.add(book('Emma'))
+    library.save()
+    assert path.stat().st_mode & 0o777 == 0o640
+
+
+def _umask():
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+@pytest.mark.parametrize('reload', [False, True])
+def test_queued_book_moves_off_an_id_another_store_used(tmp_path, monkeypatch, reload):
+    ids = itertools.chain([7, 7], itertools.count(8))
+    monkeypatch.setattr('library_core.library.new_id', lambda: next(ids))
+    queued = Library(JournalStore(str(tmp_path / 'library.json')), autosave_interval=60)
+    queued.add(book('mine'))
+    other = open_library(tmp_path)
+    other.add(book('theirs'))
+    if reload:
+        other.save()
+    queued.mark_read('mine')
+    assert queued.get(7)['title'] == 'theirs'
+    queued.flush()
+    books = {b['title']: b for b in open_library(tmp_path)}
+    assert (books['theirs']['id'], books['mine']['id']) == (7, 8)
+    assert books['mine']['read_status'] and not books['theirs']['read_status']
+    assert queued.read_date(8) is not None and queued.read_date(7) is None
+    queued.close()
+
+
+def test_sqlite_library_answers_from_the_database(tmp_path):
+    path = str(tmp_path / 'library.db')
+    first, second = Library(SqliteStore(path)), Library(SqliteStore(path))
+    first.add(book('Dune', 'Fantasy'))
+    first.add(book('Emma', 'Romance'))
+    second.mark_read('dune')
+    with pytest.raises(ValueError):
+        second.add(book('EMMA'))
+    assert first.refresh() == -1
+    assert first.search('Dune')[0]['read_status']
+    assert first.summary() == {'total': 2, 'read': 1, 'percent_read': 50.0, 'genres': {'Fantasy': 1, 'Romance': 1},
+                               'years': {2000: 2}, 'authors': {'Someone': 2}}
+    assert [b['title'] for b in first.recommend()] == ['Emma']
+    assert first.remove('Emma') == 1
+    assert (len(second), second.count(False)) == (1, 0)
+    first.close()
+    second.close()